@@ -0,0 +1,314 @@
+"""Attendance rollups over employee_checkins.
+
+Per employee we keep one document per day (`attendance_daily/{employeeId}_{date}`)
+and one per month (`attendance_monthly/{employeeId}_{YYYY-MM}`). They are
+updated incrementally as check-ins reach Firestore and can be rebuilt from
+the raw events with `AttendanceRollups.backfill`. Reports read rollups only.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+DAILY_COLLECTION = "attendance_daily"
+MONTHLY_COLLECTION = "attendance_monthly"
+
+# Firestore batches are capped at 500 writes
+MAX_BATCH_WRITES = 400
+
+
+def parse_timestamp(timestamp: Optional[str]) -> Optional[datetime]:
+    """ISO timestamp -> naive local datetime (kiosk sends UTC `...Z` strings)"""
+    if not timestamp:
+        return None
+    try:
+        dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+
+def build_daily(employee_id: str, employee_name: str, date: str,
+                first_checkin: Optional[str], last_checkout: Optional[str],
+                scheduled_start: Optional[str], late_grace_minutes: int = 0) -> Dict:
+    """Compute one daily rollup from the day's first check-in and last checkout"""
+    checkin_dt = parse_timestamp(first_checkin)
+    checkout_dt = parse_timestamp(last_checkout)
+
+    worked_minutes = 0
+    if checkin_dt and checkout_dt:
+        worked_minutes = max(0, int((checkout_dt - checkin_dt).total_seconds() // 60))
+
+    late, late_minutes = False, 0
+    if checkin_dt and scheduled_start:
+        try:
+            start_dt = datetime.strptime(f"{date} {scheduled_start}", "%Y-%m-%d %H:%M")
+            late_minutes = max(0, int((checkin_dt - start_dt).total_seconds() // 60))
+            late = late_minutes > late_grace_minutes
+            if not late:
+                late_minutes = 0
+        except ValueError:
+            pass
+
+    return {
+        "employeeId": employee_id,
+        "employeeName": employee_name,
+        "date": date,
+        "month": date[:7],
+        "firstCheckin": first_checkin,
+        "lastCheckout": last_checkout,
+        "scheduledStart": scheduled_start,
+        "workedMinutes": worked_minutes,
+        "late": late,
+        "lateMinutes": late_minutes,
+    }
+
+
+def build_monthly(employee_id: str, employee_name: str, month: str, days: Dict[str, Dict]) -> Dict:
+    """Monthly rollup: per-day summaries plus totals"""
+    return {
+        "employeeId": employee_id,
+        "employeeName": employee_name,
+        "month": month,
+        "days": days,
+        "daysPresent": sum(1 for day in days.values() if day.get("firstCheckin")),
+        "workedMinutes": sum(day.get("workedMinutes", 0) for day in days.values()),
+        "lateDays": sum(1 for day in days.values() if day.get("late")),
+        "lateMinutes": sum(day.get("lateMinutes", 0) for day in days.values()),
+    }
+
+
+def _day_summary(daily: Dict) -> Dict:
+    return {key: daily[key] for key in ("firstCheckin", "lastCheckout", "workedMinutes", "late", "lateMinutes")}
+
+
+class AttendanceRollups:
+    """Maintains attendance_daily / attendance_monthly"""
+
+    def __init__(self, db=None, server_timestamp=None, default_start: str = "09:00",
+                 late_grace_minutes: int = 0, workers: int = 8):
+        self.db = db
+        self.server_timestamp = server_timestamp
+        self.default_start = default_start
+        self.late_grace_minutes = late_grace_minutes
+        self.workers = workers
+
+        self._backfill_lock = threading.Lock()
+        self.backfill_state: Dict = {"running": False}
+
+        # Incremental updates run on their own thread (one worker keeps them in
+        # order) so the check-in replicator never waits on rollup transactions
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="attendance-rollups")
+        # Months being rebuilt; their incremental updates are deferred until done
+        self._rebuild_lock = threading.Lock()
+        self._rebuilding = set()
+        self._deferred: List[Dict] = []
+
+    # ---- incremental ------------------------------------------------------
+
+    def scheduled_start(self, employee_id: str, date: str) -> str:
+        """Start time from the active schedule, or the fulltime default"""
+        schedule_query = self.db.collection("schedule").where("employeeId", "==", employee_id).where("date", "==", date).where("status", "==", "active").limit(1).get()
+        if len(schedule_query) > 0:
+            return schedule_query[0].to_dict().get("startTime") or self.default_start
+        return self.default_start
+
+    def apply_checkin(self, checkin: Dict):
+        """Fold one check-in/checkout into the employee's daily and monthly rollups"""
+        from firebase_admin import firestore
+
+        employee_id = checkin["employeeId"]
+        date = checkin["date"]
+        month = date[:7]
+        daily_ref = self.db.collection(DAILY_COLLECTION).document(f"{employee_id}_{date}")
+        monthly_ref = self.db.collection(MONTHLY_COLLECTION).document(f"{employee_id}_{month}")
+
+        @firestore.transactional
+        def update(transaction, scheduled_start):
+            daily_snap = daily_ref.get(transaction=transaction)
+            monthly_snap = monthly_ref.get(transaction=transaction)
+            current = daily_snap.to_dict() if daily_snap.exists else {}
+
+            first_checkin = current.get("firstCheckin")
+            last_checkout = current.get("lastCheckout")
+            event_dt = parse_timestamp(checkin.get("timestamp"))
+            if checkin["checkinType"] == "checkin":
+                if not first_checkin or (event_dt and event_dt < parse_timestamp(first_checkin)):
+                    first_checkin = checkin.get("timestamp")
+            elif checkin["checkinType"] == "checkout":
+                if not last_checkout or (event_dt and event_dt > parse_timestamp(last_checkout)):
+                    last_checkout = checkin.get("timestamp")
+
+            daily = build_daily(
+                employee_id, checkin.get("employeeName", ""), date, first_checkin, last_checkout,
+                current.get("scheduledStart") or scheduled_start, self.late_grace_minutes,
+            )
+            days = (monthly_snap.to_dict() or {}).get("days", {}) if monthly_snap.exists else {}
+            days[date] = _day_summary(daily)
+            monthly = build_monthly(employee_id, daily["employeeName"], month, days)
+
+            transaction.set(daily_ref, dict(daily, updatedAt=self.server_timestamp))
+            transaction.set(monthly_ref, dict(monthly, updatedAt=self.server_timestamp))
+
+        # Schedule lookup happens outside the transaction (only needed for a new day)
+        daily_snap = daily_ref.get()
+        scheduled_start = None
+        if not (daily_snap.exists and daily_snap.to_dict().get("scheduledStart")):
+            scheduled_start = self.scheduled_start(employee_id, date)
+        update(self.db.transaction(), scheduled_start)
+
+    def apply_checkins(self, checkins: Iterable[Dict]):
+        """Replicator hook: queue the updates and return immediately"""
+        if self.db is None:
+            return
+        for checkin in checkins:
+            self._executor.submit(self._apply_safe, checkin)
+
+    def _apply_safe(self, checkin: Dict):
+        """Never raises; a later backfill repairs any miss"""
+        with self._rebuild_lock:
+            if checkin["date"][:7] in self._rebuilding:
+                self._deferred.append(checkin)
+                return
+        try:
+            self.apply_checkin(checkin)
+        except Exception as e:
+            print(f"⚠️ Attendance rollup update failed for {checkin.get('employeeId')} {checkin.get('date')}: {e}")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    # ---- backfill ---------------------------------------------------------
+
+    def _rebuild_month(self, month: str) -> Dict:
+        """Recompute every rollup of one month, holding back incremental updates meanwhile.
+
+        Check-ins replicated while the month is read and rewritten are deferred
+        and re-applied on top of the rebuilt documents (updates are idempotent).
+        """
+        with self._rebuild_lock:
+            self._rebuilding.add(month)
+        try:
+            return self._rebuild_month_snapshot(month)
+        finally:
+            with self._rebuild_lock:
+                self._rebuilding.discard(month)
+                deferred = [c for c in self._deferred if c["date"][:7] == month]
+                self._deferred = [c for c in self._deferred if c["date"][:7] != month]
+            for checkin in deferred:
+                self._executor.submit(self._apply_safe, checkin)
+
+    def _rebuild_month_snapshot(self, month: str) -> Dict:
+        start, end = f"{month}-01", f"{month}-31"
+
+        events: Dict[tuple, Dict] = {}
+        checkins_query = self.db.collection("employee_checkins").where("date", ">=", start).where("date", "<=", end)
+        for doc in checkins_query.stream():
+            data = doc.to_dict()
+            if data.get("status", "success") != "success":
+                continue
+            key = (data.get("employeeId"), data.get("date"))
+            entry = events.setdefault(key, {"employeeName": data.get("employeeName", ""), "checkin": None, "checkout": None})
+            ts = data.get("timestamp")
+            ts_dt = parse_timestamp(ts)
+            if ts_dt is None:
+                continue
+            if data.get("checkinType") == "checkin":
+                if entry["checkin"] is None or ts_dt < parse_timestamp(entry["checkin"]):
+                    entry["checkin"] = ts
+            elif data.get("checkinType") == "checkout":
+                if entry["checkout"] is None or ts_dt > parse_timestamp(entry["checkout"]):
+                    entry["checkout"] = ts
+
+        schedules = {}
+        schedule_query = self.db.collection("schedule").where("date", ">=", start).where("date", "<=", end)
+        for doc in schedule_query.stream():
+            data = doc.to_dict()
+            if data.get("status") == "active":
+                schedules[(data.get("employeeId"), data.get("date"))] = data.get("startTime")
+
+        dailies: List[Dict] = []
+        months: Dict[str, Dict] = {}
+        for (employee_id, date), entry in events.items():
+            if not employee_id or not date:
+                continue
+            daily = build_daily(
+                employee_id, entry["employeeName"], date, entry["checkin"], entry["checkout"],
+                schedules.get((employee_id, date), self.default_start), self.late_grace_minutes,
+            )
+            dailies.append(daily)
+            month_entry = months.setdefault(employee_id, {"employeeName": daily["employeeName"], "days": {}})
+            month_entry["days"][date] = _day_summary(daily)
+
+        writes = [
+            (self.db.collection(DAILY_COLLECTION).document(f"{d['employeeId']}_{d['date']}"), d)
+            for d in dailies
+        ] + [
+            (self.db.collection(MONTHLY_COLLECTION).document(f"{employee_id}_{month}"),
+             build_monthly(employee_id, entry["employeeName"], month, entry["days"]))
+            for employee_id, entry in months.items()
+        ]
+        for i in range(0, len(writes), MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for ref, data in writes[i:i + MAX_BATCH_WRITES]:
+                batch.set(ref, dict(data, updatedAt=self.server_timestamp))
+            batch.commit()
+
+        return {"month": month, "checkinDays": len(dailies), "employees": len(months)}
+
+    def backfill(self, months: List[str]) -> Dict:
+        """Rebuild rollups for the given months in parallel"""
+        with self._backfill_lock:
+            if self.backfill_state.get("running"):
+                raise RuntimeError("Backfill is already running")
+            self.backfill_state = {"running": True, "months": months, "done": [], "errors": {}, "startedAt": time.time()}
+
+        print(f"📊 Rebuilding attendance rollups for {len(months)} month(s)...")
+        with ThreadPoolExecutor(max_workers=min(self.workers, max(1, len(months)))) as executor:
+            futures = {month: executor.submit(self._rebuild_month, month) for month in months}
+            for month, future in futures.items():
+                try:
+                    self.backfill_state["done"].append(future.result())
+                except Exception as e:
+                    print(f"❌ Attendance backfill failed for {month}: {e}")
+                    self.backfill_state["errors"][month] = f"{type(e).__name__}: {e}"
+
+        self.backfill_state["running"] = False
+        self.backfill_state["finishedAt"] = time.time()
+        print(f"✅ Attendance backfill finished: {len(self.backfill_state['done'])} ok, {len(self.backfill_state['errors'])} failed")
+        return self.backfill_state
+
+    # ---- reports ----------------------------------------------------------
+
+    def monthly_report(self, month: str, employee_id: Optional[str] = None, include_days: bool = False) -> List[Dict]:
+        if employee_id:
+            snap = self.db.collection(MONTHLY_COLLECTION).document(f"{employee_id}_{month}").get()
+            docs = [snap] if snap.exists else []
+        else:
+            docs = self.db.collection(MONTHLY_COLLECTION).where("month", "==", month).stream()
+
+        rows = []
+        for doc in docs:
+            data = doc.to_dict()
+            data.pop("updatedAt", None)
+            if not include_days:
+                data.pop("days", None)
+            rows.append(data)
+        return rows
+
+    def daily_report(self, date: str, employee_id: Optional[str] = None) -> List[Dict]:
+        if employee_id:
+            snap = self.db.collection(DAILY_COLLECTION).document(f"{employee_id}_{date}").get()
+            docs = [snap] if snap.exists else []
+        else:
+            docs = self.db.collection(DAILY_COLLECTION).where("date", "==", date).stream()
+
+        rows = []
+        for doc in docs:
+            data = doc.to_dict()
+            data.pop("updatedAt", None)
+            rows.append(data)
+        return rows
@@ -0,0 +1,134 @@
+"""Employee and schedule caches for the check-in hot path.
+
+`/face/checkin` must not wait on Firestore, so the data it validates
+against (employee exists, shift, today's active schedules) is kept in
+memory and refreshed by Firestore snapshot listeners: one initial load,
+then only changed documents. Deleted employees and shift changes show up
+within seconds while Firestore is reachable.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+EMPLOYEE_FIELDS = ("fullName", "position", "avatarUrl", "shift")
+
+
+class CheckinDirectory:
+    """In-memory view of `employees` and today's `schedule` documents"""
+
+    def __init__(self, rollover_interval: float = 60.0):
+        self.rollover_interval = rollover_interval
+
+        self._lock = threading.Lock()
+        self._employees: Dict[str, Dict] = {}
+        self._schedules: Dict[Tuple[str, str], Dict] = {}
+        self.employees_synced_at: Optional[float] = None
+        # Date whose schedules are fully loaded (None until the first snapshot)
+        self.schedules_date: Optional[str] = None
+        self.schedules_synced_at: Optional[float] = None
+
+        self._db = None
+        self._employee_watch = None
+        self._schedule_watch = None
+        self._watch_date: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- lookups ----------------------------------------------------------
+
+    @property
+    def employees_loaded(self) -> bool:
+        return self.employees_synced_at is not None
+
+    def employee(self, employee_id: str) -> Optional[Dict]:
+        with self._lock:
+            data = self._employees.get(employee_id)
+        return dict(data) if data is not None else None
+
+    def schedules_loaded(self, date: str) -> bool:
+        return self.schedules_date == date
+
+    def schedule(self, employee_id: str, date: str) -> Optional[Dict]:
+        with self._lock:
+            return self._schedules.get((employee_id, date))
+
+    # ---- snapshot callbacks -----------------------------------------------
+
+    def apply_employee_changes(self, changes):
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    self._employees.pop(doc.id, None)
+                else:
+                    data = doc.to_dict() or {}
+                    self._employees[doc.id] = {field: data.get(field, "") for field in EMPLOYEE_FIELDS}
+        self.employees_synced_at = time.time()
+
+    def apply_schedule_changes(self, date: str, changes):
+        with self._lock:
+            if date != self._watch_date:
+                return
+            for change in changes:
+                doc = change.document
+                data = doc.to_dict() or {}
+                key = (data.get("employeeId"), date)
+                if change.type.name == "REMOVED":
+                    self._schedules.pop(key, None)
+                else:
+                    self._schedules[key] = data
+        self.schedules_date = date
+        self.schedules_synced_at = time.time()
+
+    # ---- listeners --------------------------------------------------------
+
+    def _watch_schedules(self, date: str):
+        if self._schedule_watch is not None:
+            self._schedule_watch.unsubscribe()
+        with self._lock:
+            self._watch_date = date
+            self._schedules = {}
+        self.schedules_date = None
+        query = self._db.collection("schedule").where("date", "==", date).where("status", "==", "active")
+        self._schedule_watch = query.on_snapshot(
+            lambda docs, changes, read_time: self.apply_schedule_changes(date, changes)
+        )
+
+    def _run(self):
+        # Re-subscribe the schedule listener when the day changes
+        while not self._stop.wait(self.rollover_interval):
+            today = datetime.now().strftime("%Y-%m-%d")
+            if today != self._watch_date:
+                try:
+                    self._watch_schedules(today)
+                    print(f"📅 Watching schedules for {today}")
+                except Exception as e:
+                    print(f"⚠️ Could not watch schedules for {today}: {e}")
+
+    def start(self, db):
+        self._db = db
+        self._employee_watch = db.collection("employees").on_snapshot(
+            lambda docs, changes, read_time: self.apply_employee_changes(changes)
+        )
+        self._watch_schedules(datetime.now().strftime("%Y-%m-%d"))
+        self._thread = threading.Thread(target=self._run, name="checkin-directory", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for watch in (self._employee_watch, self._schedule_watch):
+            if watch is not None:
+                try:
+                    watch.unsubscribe()
+                except Exception:
+                    pass
+
+    def stats(self) -> Dict:
+        return {
+            "employees": len(self._employees),
+            "employees_synced_at": self.employees_synced_at,
+            "schedules_date": self.schedules_date,
+            "schedules": len(self._schedules),
+            "schedules_synced_at": self.schedules_synced_at,
+        }
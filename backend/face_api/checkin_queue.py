@@ -0,0 +1,278 @@
+"""Local write-ahead queue for check-ins.
+
+Check-ins are acknowledged as soon as they are durably written to a local
+SQLite file; a background replicator drains them to Firestore in batches.
+Document ids are deterministic and written with `create`, so a check-in
+already stored by another server (or by a replayed batch) is skipped
+instead of overwritten.
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_WRITES = 500
+
+
+def _is_already_exists(error: Exception) -> bool:
+    try:
+        from google.api_core.exceptions import AlreadyExists
+    except ImportError:
+        return False
+    return isinstance(error, AlreadyExists)
+
+
+def make_checkin_id(employee_id: str, checkin_type: str, date: str) -> str:
+    """Idempotent document id for one check-in/checkout per employee per day"""
+    return f"{employee_id}_{date}_{checkin_type}"
+
+
+class CheckinQueue:
+    """SQLite-backed write-ahead log + Firestore replicator"""
+
+    def __init__(self, path: str, db=None, server_timestamp=None,
+                 batch_size: int = 50, poll_interval: float = 1.0,
+                 max_backoff: float = 60.0, retention_days: int = 7, on_replicated=None):
+        self.path = path
+        self.db = db
+        # Sentinel used for createdAt (firestore.SERVER_TIMESTAMP in production,
+        # anything serializable when running against a local stand-in)
+        self.server_timestamp = server_timestamp
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.retention_days = retention_days
+        # Called with the check-in dicts of each committed batch
+        self.on_replicated = on_replicated
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.last_replicated_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.replicated_total = 0
+        self.duplicates_total = 0
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkins (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL UNIQUE,
+                employee_id TEXT NOT NULL,
+                checkin_type TEXT NOT NULL,
+                date TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                queued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                replicated_at REAL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_checkins_pending ON checkins (replicated_at, seq)"
+        )
+
+    # ---- write path -------------------------------------------------------
+
+    def exists(self, checkin_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM checkins WHERE id = ?", (checkin_id,)).fetchone()
+        return row is not None
+
+    def enqueue(self, checkin_id: str, checkin_data: Dict, notifications: List[Dict]) -> bool:
+        """Durably store a check-in. Returns False if the id is already queued."""
+        payload = json.dumps({"checkin": checkin_data, "notifications": notifications}, ensure_ascii=False)
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO checkins (id, employee_id, checkin_type, date, payload, queued_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (checkin_id, checkin_data["employeeId"], checkin_data["checkinType"],
+                     checkin_data["date"], payload, time.time()),
+                )
+            except sqlite3.IntegrityError:
+                return False
+        self._wakeup.set()
+        return True
+
+    # ---- replication ------------------------------------------------------
+
+    def _pending(self, limit: int):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, id, payload FROM checkins WHERE replicated_at IS NULL ORDER BY seq LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+    def replicate_once(self) -> int:
+        """Push one batch to Firestore. Returns number of queued check-ins handled."""
+        if self.db is None:
+            return 0
+
+        rows = self._pending(self.batch_size)
+        if not rows:
+            return 0
+
+        entries = []
+        write_count = 0
+        for seq, checkin_id, payload in rows:
+            data = json.loads(payload)
+            checkin_ref = self.db.collection("employee_checkins").document(checkin_id)
+            writes = [(checkin_ref, dict(data["checkin"], createdAt=self.server_timestamp))]
+            for notif in data["notifications"]:
+                notif_id = notif.pop("_id")
+                notif["createdAt"] = self.server_timestamp
+                writes.append((self.db.collection("notifications").document(notif_id), notif))
+            # The rest stays pending for the next batch
+            if entries and write_count + len(writes) > MAX_BATCH_WRITES:
+                break
+            write_count += len(writes)
+            entries.append((seq, data["checkin"], writes))
+
+        error = None
+        try:
+            self._commit(entries)
+            created, duplicates = entries, []
+        except Exception as e:
+            if not _is_already_exists(e):
+                self._record_failure(e, [entry[0] for entry in entries])
+                raise
+            # Some check-in is already in Firestore: write one by one, skip those
+            created, duplicates, error = self._create_individually(entries)
+
+        self._mark_replicated(created, duplicates)
+        if self.on_replicated and created:
+            try:
+                self.on_replicated([entry[1] for entry in created])
+            except Exception as e:
+                print(f"⚠️ on_replicated hook failed: {e}")
+        if error:
+            done = created + duplicates
+            self._record_failure(error, [entry[0] for entry in entries if entry not in done])
+            raise error
+        return len(created) + len(duplicates)
+
+    def _commit(self, entries):
+        batch = self.db.batch()
+        for _, _, writes in entries:
+            for ref, data in writes:
+                batch.create(ref, data)
+        batch.commit()
+
+    def _create_individually(self, entries):
+        """Commit each check-in on its own; (created, duplicates, first other error)"""
+        created, duplicates = [], []
+        for entry in entries:
+            try:
+                self._commit([entry])
+            except Exception as e:
+                if not _is_already_exists(e):
+                    return created, duplicates, e
+                # Stored by another server (with its notifications); keep that version
+                duplicates.append(entry)
+                continue
+            created.append(entry)
+        return created, duplicates, None
+
+    def _mark_replicated(self, created, duplicates):
+        now = time.time()
+        with self._lock:
+            for entries, error in ((created, None), (duplicates, "already exists")):
+                if not entries:
+                    continue
+                seqs = [entry[0] for entry in entries]
+                self._conn.execute(
+                    f"UPDATE checkins SET replicated_at = ?, last_error = ? WHERE seq IN ({','.join('?' * len(seqs))})",
+                    [now, error, *seqs],
+                )
+        if created or duplicates:
+            self.last_replicated_at = now
+            self.last_error = None
+        self.replicated_total += len(created)
+        self.duplicates_total += len(duplicates)
+        if duplicates:
+            print(f"⚠️ Skipped {len(duplicates)} check-in(s) already recorded by another server")
+
+    def _record_failure(self, error: Exception, seqs: List[int]):
+        self.last_error = f"{type(error).__name__}: {error}"
+        placeholders = ",".join("?" * len(seqs))
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE checkins SET attempts = attempts + 1, last_error = ? WHERE seq IN ({placeholders})",
+                [self.last_error, *seqs],
+            )
+
+    def prune(self):
+        """Drop replicated rows older than retention_days (kept for local duplicate checks)"""
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM checkins WHERE replicated_at IS NOT NULL AND replicated_at < ?", (cutoff,)
+            )
+
+    def _run(self):
+        backoff = self.poll_interval
+        last_prune = 0.0
+        while not self._stop.is_set():
+            try:
+                replicated = self.replicate_once()
+                backoff = self.poll_interval
+                if replicated:
+                    print(f"🔁 Replicated {replicated} check-in(s) to Firestore")
+                    # More may be waiting; drain without sleeping
+                    continue
+                if time.time() - last_prune > 3600:
+                    self.prune()
+                    last_prune = time.time()
+            except Exception as e:
+                print(f"⚠️ Check-in replication failed, retrying in {backoff:.0f}s: {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="checkin-replicator", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        # Final best-effort drain so a clean shutdown leaves nothing behind
+        try:
+            while self.replicate_once():
+                pass
+        except Exception as e:
+            print(f"⚠️ Pending check-ins left in local queue: {e}")
+
+    # ---- observability ----------------------------------------------------
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending, oldest = self._conn.execute(
+                "SELECT COUNT(*), MIN(queued_at) FROM checkins WHERE replicated_at IS NULL"
+            ).fetchone()
+        now = time.time()
+        return {
+            "pending": pending,
+            "lag_seconds": round(now - oldest, 2) if oldest else 0.0,
+            "replicated_total": self.replicated_total,
+            "duplicates_total": self.duplicates_total,
+            "last_replicated_at": self.last_replicated_at,
+            "last_error": self.last_error,
+            "replicator_running": bool(self._thread and self._thread.is_alive()),
+        }
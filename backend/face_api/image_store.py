@@ -0,0 +1,191 @@
+"""Content-addressed storage for employee face images.
+
+Images are named by the SHA-256 of the uploaded bytes, so re-uploading the
+same photo is free. The (optionally downscaled) JPEG and a small thumbnail
+for the admin UI are written on a background thread pool; callers only pay
+for hashing. Firestore stores the key (`<hash>.jpg`), not an absolute path.
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+THUMBNAIL_DIR = "thumbs"
+
+
+def _fit(img, max_side: int):
+    """Downscale so the longest side is at most max_side (never upscales)"""
+    import cv2
+    
+    height, width = img.shape[:2]
+    scale = max_side / float(max(height, width))
+    if scale >= 1:
+        return img
+    return cv2.resize(img, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+class ImageStore:
+    """Face image store rooted at a single directory"""
+
+    def __init__(self, root: str, max_side: int = 800, quality: int = 90,
+                 thumb_side: int = 160, thumb_quality: int = 80, workers: int = 2):
+        self.root = os.path.abspath(root)
+        self.max_side = max_side
+        self.quality = quality
+        self.thumb_side = thumb_side
+        self.thumb_quality = thumb_quality
+        os.makedirs(os.path.join(self.root, THUMBNAIL_DIR), exist_ok=True)
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-store")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    # ---- paths ------------------------------------------------------------
+
+    @staticmethod
+    def key_for(image_bytes: bytes) -> str:
+        return hashlib.sha256(image_bytes).hexdigest() + ".jpg"
+
+    def path(self, key: str) -> str:
+        """Absolute path for a key; legacy absolute faceImagePath values pass through"""
+        if os.path.isabs(key):
+            return key
+        return os.path.join(self.root, os.path.basename(key))
+
+    def thumbnail_path(self, key: str) -> str:
+        return os.path.join(self.root, THUMBNAIL_DIR, os.path.basename(key))
+
+    # ---- writes -----------------------------------------------------------
+
+    def put(self, image_bytes: bytes, img: Optional[np.ndarray] = None) -> str:
+        """Schedule a write and return the image key immediately.
+
+        `img` is the already-decoded BGR image, if the caller has one.
+        """
+        key = self.key_for(image_bytes)
+        with self._lock:
+            if key in self._pending:
+                return key
+            if os.path.exists(self.path(key)):
+                # Re-used image: refresh mtime so collect_garbage's grace period
+                # covers the window before the new reference reaches Firestore
+                for path in (self.path(key), self.thumbnail_path(key)):
+                    try:
+                        os.utime(path)
+                    except OSError:
+                        pass
+                return key
+            self._pending[key] = self._executor.submit(self._write, key, image_bytes, img)
+        return key
+
+    def _write(self, key: str, image_bytes: bytes, img: Optional[np.ndarray]):
+        import cv2
+        
+        try:
+            if img is None:
+                img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                raise ValueError("cannot decode image")
+
+            full = _fit(img, self.max_side)
+            if full is img and image_bytes[:2] == b"\xff\xd8":
+                # Already small enough and JPEG: keep the original bytes
+                data = image_bytes
+            else:
+                ok, buf = cv2.imencode(".jpg", full, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if not ok:
+                    raise ValueError("cannot encode image")
+                data = buf.tobytes()
+            self._atomic_write(self.path(key), data)
+
+            ok, thumb = cv2.imencode(".jpg", _fit(img, self.thumb_side),
+                                     [cv2.IMWRITE_JPEG_QUALITY, self.thumb_quality])
+            if ok:
+                self._atomic_write(self.thumbnail_path(key), thumb.tobytes())
+            print(f"💾 Stored face image: {key}")
+        except Exception as e:
+            print(f"❌ Error storing face image {key}: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def wait(self, key: str, timeout: Optional[float] = None):
+        """Block until a pending write for key (if any) has finished"""
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            future.result(timeout)
+
+    def flush(self, timeout: Optional[float] = None):
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    # ---- deletes / GC -----------------------------------------------------
+
+    def delete(self, key: str) -> bool:
+        """Delete an image and its thumbnail. Returns True if the image existed.
+
+        Content-addressed images may be shared between employees; callers
+        should only delete files they know are unreferenced (see collect_garbage).
+        """
+        self.wait(key)
+        deleted = False
+        path = self.path(key)
+        if os.path.exists(path):
+            os.remove(path)
+            deleted = True
+        thumb = self.thumbnail_path(key)
+        if not os.path.isabs(key) and os.path.exists(thumb):
+            os.remove(thumb)
+        return deleted
+
+    def collect_garbage(self, referenced: Iterable[str], grace_seconds: float = 3600,
+                        dry_run: bool = False) -> Dict:
+        """Remove images (and thumbnails) that no employee document references.
+
+        Files younger than grace_seconds are kept: their Firestore update may
+        still be in flight.
+        """
+        keep = {os.path.basename(key) for key in referenced if key}
+        cutoff = time.time() - grace_seconds
+        removed, freed = [], 0
+
+        for directory in (self.root, os.path.join(self.root, THUMBNAIL_DIR)):
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if not os.path.isfile(path) or name in keep:
+                    continue
+                if not name.lower().endswith((".jpg", ".jpeg", ".png")):
+                    continue
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                with self._lock:
+                    if name in self._pending:
+                        continue
+                if not dry_run:
+                    os.remove(path)
+                removed.append(os.path.relpath(path, self.root))
+                freed += stat.st_size
+
+        return {"removed": removed, "count": len(removed), "freedBytes": freed, "dryRun": dry_run}
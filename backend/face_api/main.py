@@ -1,15 +1,26 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-import firebase_admin
-from firebase_admin import credentials, firestore
-import cv2
 import numpy as np
-import face_recognition
 import os
 import base64
 from typing import Optional, List, Dict
 import tempfile
+import re
+import json
+import time
+import threading
+import hmac
+
+# cv2, face_recognition (dlib models) and firebase_admin are imported lazily:
+# the server binds immediately and warm_up() loads them in the background.
+from checkin_queue import CheckinQueue, make_checkin_id
+from checkin_directory import CheckinDirectory
+from image_store import ImageStore
+from attendance import AttendanceRollups
+from reencode import EncodingMigration, encoding_version
+from profiler import SamplingProfiler, ProfilingMiddleware
 
 app = FastAPI(title="Face Recognition API")
 
@@ -22,40 +33,118 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Firebase initialization
-# Try multiple possible paths
+# On-demand sampling profiler (idle unless started via /face/profile/start)
+profiler = SamplingProfiler()
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+PROFILE_TARGETS = [("main.py", "recognize_face"), ("main.py", "register_face"), ("main.py", "process_checkin")]
+
 script_dir = os.path.dirname(os.path.abspath(__file__))
-possible_cred_paths = [
-    os.path.join(script_dir, "gym-managment-aa0a1-firebase-adminsdk-fbsvc-5004fe1cc0.json"),
-    os.path.join(script_dir, "..", "face_checkin", "gym-managment-aa0a1-firebase-adminsdk-fbsvc-5004fe1cc0.json"),
-    os.path.join(script_dir, "..", "..", "frontend_react", "face_checkin", "gym-managment-aa0a1-firebase-adminsdk-fbsvc-5004fe1cc0.json"),
-]
-
-cred_path = None
-for path in possible_cred_paths:
-    if os.path.exists(path):
-        cred_path = path
-        break
-
-if cred_path and os.path.exists(cred_path):
-    try:
-        print(f"📁 Loading Firebase credentials from: {cred_path}")
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-        db = firestore.client()
-        print("✅ Firebase initialized successfully")
-    except Exception as e:
-        print(f"⚠️ Firebase already initialized or error: {e}")
-        db = firestore.client()
-else:
-    print("❌ Firebase credentials file not found!")
-    print(f"   Searched in: {possible_cred_paths}")
-    db = None
+
+# Firestore client, set by init_firebase() during warm-up
+db = None
+
+
+def init_firebase():
+    """Initialize Firebase Admin and the Firestore client"""
+    global db
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    
+    # Try multiple possible paths
+    possible_cred_paths = [
+        os.path.join(script_dir, "gym-managment-aa0a1-firebase-adminsdk-fbsvc-5004fe1cc0.json"),
+        os.path.join(script_dir, "..", "face_checkin", "gym-managment-aa0a1-firebase-adminsdk-fbsvc-5004fe1cc0.json"),
+        os.path.join(script_dir, "..", "..", "frontend_react", "face_checkin", "gym-managment-aa0a1-firebase-adminsdk-fbsvc-5004fe1cc0.json"),
+    ]
+    
+    cred_path = None
+    for path in possible_cred_paths:
+        if os.path.exists(path):
+            cred_path = path
+            break
+    
+    if cred_path and os.path.exists(cred_path):
+        try:
+            print(f"📁 Loading Firebase credentials from: {cred_path}")
+            cred = credentials.Certificate(cred_path)
+            firebase_admin.initialize_app(cred)
+            db = firestore.client()
+            print("✅ Firebase initialized successfully")
+        except Exception as e:
+            print(f"⚠️ Firebase already initialized or error: {e}")
+            db = firestore.client()
+    else:
+        print("❌ Firebase credentials file not found!")
+        print(f"   Searched in: {possible_cred_paths}")
+        db = None
+    
+    checkin_queue.db = db
+    checkin_queue.server_timestamp = firestore.SERVER_TIMESTAMP
+    attendance_rollups.db = db
+    encoding_migration.db = db
+    attendance_rollups.server_timestamp = firestore.SERVER_TIMESTAMP
+
 
 # Storage for face encodings (in production, use database)
 known_face_encodings = {}
 known_face_metadata = {}
 
+# Settings used to produce stored face encodings; every encoding records its version
+FACE_ENCODING_DETECTOR = os.getenv("FACE_ENCODING_DETECTOR", "hog")
+FACE_ENCODING_JITTERS = int(os.getenv("FACE_ENCODING_JITTERS", "2"))
+FACE_ENCODING_MODEL = os.getenv("FACE_ENCODING_MODEL", "large")
+ENCODING_VERSION = encoding_version(FACE_ENCODING_DETECTOR, FACE_ENCODING_JITTERS, FACE_ENCODING_MODEL)
+
+# Local write-ahead queue for check-ins (drained to Firestore in the background)
+CHECKIN_WAL_PATH = os.getenv("CHECKIN_WAL_PATH", os.path.join(script_dir, "checkin_wal.sqlite3"))
+# Bounded Firestore lookups for check-ins recorded at another kiosk
+CHECKIN_REMOTE_TIMEOUT = float(os.getenv("CHECKIN_REMOTE_TIMEOUT", "1.5"))
+# Daily/monthly attendance rollups, updated as check-ins reach Firestore
+attendance_rollups = AttendanceRollups(
+    default_start=os.getenv("ATTENDANCE_DEFAULT_START", "09:00"),
+    late_grace_minutes=int(os.getenv("ATTENDANCE_LATE_GRACE_MINUTES", "0")),
+)
+
+encoding_migration = EncodingMigration(
+    None,
+    resolve_path=lambda key: image_store.path(key),
+    detector=FACE_ENCODING_DETECTOR,
+    num_jitters=FACE_ENCODING_JITTERS,
+    model=FACE_ENCODING_MODEL,
+)
+
+checkin_queue = CheckinQueue(
+    CHECKIN_WAL_PATH,
+    batch_size=int(os.getenv("CHECKIN_BATCH_SIZE", "50")),
+    on_replicated=attendance_rollups.apply_checkins,
+)
+
+# Startup lifecycle (see warm_up)
+WARMUP_IMAGE_PATH = os.getenv("WARMUP_IMAGE_PATH", os.path.join(script_dir, "warmup.jpg"))
+startup_state = {
+    "ready": False,
+    "firebase": False,
+    "gallery": False,
+    "models": False,
+    "error": None,
+    "startedAt": None,
+    "readyAt": None,
+}
+
+# Short-TTL cache for /face/employees/unregistered: (limit, cursor) -> (expiresAt, employees, nextCursor)
+UNREGISTERED_CACHE_TTL = float(os.getenv("UNREGISTERED_CACHE_TTL", "30"))
+UNREGISTERED_MAX_PAGE_SIZE = 500
+UNREGISTERED_CACHE_MAX_ENTRIES = 256
+UNREGISTERED_FIELDS = ["fullName", "position", "avatarUrl"]
+unregistered_cache = {}
+# NDJSON streams fill the cache from the threadpool; invalidation bumps the
+# generation so a page read before a register/delete is not stored afterwards
+unregistered_cache_lock = threading.Lock()
+unregistered_cache_state = {"generation": 0}
+
+# Employees and today's schedules for check-in validation, kept fresh by Firestore listeners
+checkin_directory = CheckinDirectory()
+
 
 # Request models
 class FaceRegisterRequest(BaseModel):
@@ -75,10 +164,18 @@ class CheckinRequest(BaseModel):
 
 
 # Helper functions
-def save_base64_image(base64_string: str, filename: str) -> str:
-    """Save base64 image to file"""
-    # Get the directory of this file and resolve paths
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+def decode_base64_image(base64_string: str) -> bytes:
+    """Decode a base64 image (with or without data URL prefix) to raw bytes"""
+    # Remove data URL prefix if present
+    if ',' in base64_string:
+        base64_string = base64_string.split(',')[1]
+    return base64.b64decode(base64_string)
+
+
+def resolve_face_image_dir() -> str:
+    """Pick the face image directory once at startup"""
+    if os.getenv("FACE_IMAGE_DIR"):
+        return os.getenv("FACE_IMAGE_DIR")
     
     # Try multiple possible paths
     possible_paths = [
@@ -86,61 +183,21 @@ def save_base64_image(base64_string: str, filename: str) -> str:
         os.path.join(script_dir, "..", "..", "face_checkin", "employees_faces"),
         os.path.join(os.getcwd(), "face_checkin", "employees_faces"),
     ]
-    
-    save_dir = None
     for path in possible_paths:
         abs_path = os.path.abspath(path)
         if os.path.exists(os.path.dirname(abs_path)):
-            save_dir = abs_path
-            break
-    
-    if not save_dir:
-        save_dir = os.path.join(script_dir, "employees_faces")
-    
-    os.makedirs(save_dir, exist_ok=True)
-    filepath = os.path.join(save_dir, filename)
-    
-    print(f"📁 Saving to: {filepath}")
+            return abs_path
     
-    # Remove data URL prefix if present
-    if ',' in base64_string:
-        base64_string = base64_string.split(',')[1]
-    
-    image_data = base64.b64decode(base64_string)
-    with open(filepath, 'wb') as f:
-        f.write(image_data)
-    
-    return filepath
+    return os.path.join(script_dir, "employees_faces")
 
 
-def load_face_encodings_from_firestore():
-    """Load all face encodings from Firestore"""
-    global known_face_encodings, known_face_metadata
-    
-    if not db:
-        return
-    
-    try:
-        employees_ref = db.collection("employees")
-        docs = employees_ref.stream()
-        
-        for doc in docs:
-            emp_data = doc.to_dict()
-            if emp_data.get("faceRegistered") and emp_data.get("faceEncoding"):
-                known_face_encodings[doc.id] = np.array(emp_data["faceEncoding"])
-                known_face_metadata[doc.id] = {
-                    "fullName": emp_data.get("fullName", ""),
-                    "position": emp_data.get("position", ""),
-                    "avatarUrl": emp_data.get("avatarUrl", "")
-                }
-        
-        print(f"✅ Loaded {len(known_face_encodings)} face encodings from Firestore")
-    except Exception as e:
-        print(f"❌ Error loading face encodings: {e}")
-
-
-# Load face encodings on startup
-load_face_encodings_from_firestore()
+image_store = ImageStore(
+    resolve_face_image_dir(),
+    max_side=int(os.getenv("FACE_IMAGE_MAX_SIDE", "800")),
+    quality=int(os.getenv("FACE_IMAGE_QUALITY", "90")),
+    thumb_side=int(os.getenv("FACE_THUMBNAIL_SIDE", "160")),
+)
+print(f"📁 Face images stored in: {image_store.root}")
 
 
 @app.get("/")
@@ -152,57 +209,68 @@ def root():
 def health_check():
     return {
         "status": "healthy",
+        "ready": startup_state["ready"],
         "firestore_connected": db is not None,
-        "loaded_faces": len(known_face_encodings)
+        "loaded_faces": len(known_face_encodings),
+        "encoding_version": ENCODING_VERSION,
+        "outdated_encodings": sum(1 for meta in known_face_metadata.values() if meta.get("encodingVersion") != ENCODING_VERSION),
+        "checkin_queue": checkin_queue.stats(),
+        "checkin_directory": checkin_directory.stats()
     }
 
 
+@app.get("/face/health/live")
+def liveness_check():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "alive"}
+
+
+@app.get("/face/health/ready")
+def readiness_check():
+    """Readiness: Firebase, face gallery and models are loaded and warmed up"""
+    if not startup_state["ready"]:
+        raise HTTPException(status_code=503, detail=startup_state)
+    return {"status": "ready", **startup_state}
+
+
 @app.post("/face/register")
 async def register_face(request: FaceRegisterRequest):
     """Register a face for an employee"""
+    import cv2
+    import face_recognition
+    from firebase_admin import firestore
+    
     try:
         print(f"📥 Received registration request for: {request.employeeId}")
         
-        # Save image with timestamp to avoid Unicode issues in filename
-        import time
-        timestamp = int(time.time() * 1000)
-        filename = f"{request.employeeId}_{timestamp}.jpg"
-        print(f"💾 Saving image to: {filename}")
-        
-        image_path = save_base64_image(request.imageBase64, filename)
-        print(f"✅ Image saved to: {image_path}")
-        
-        # Load and encode face
-        print("🔍 Loading image for face encoding...")
-        img = face_recognition.load_image_file(image_path)
+        # Decode in memory; the image is only written to disk once it passes validation
+        image_bytes = decode_base64_image(request.imageBase64)
         
         # VALIDATION: Check image quality
         # 1. Check if image is too dark or too bright
-        cv_img = cv2.imread(image_path)
+        cv_img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
         if cv_img is None:
-            os.remove(image_path)
             raise HTTPException(status_code=400, detail="Không thể đọc file ảnh. Vui lòng thử lại")
         
+        # face_recognition expects RGB
+        img = np.ascontiguousarray(cv_img[:, :, ::-1])
+        
         gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
         mean_brightness = np.mean(gray)
         if mean_brightness < 30:
-            os.remove(image_path)
             raise HTTPException(status_code=400, detail="Ảnh quá tối. Vui lòng chụp ở nơi có ánh sáng tốt hơn")
         if mean_brightness > 225:
-            os.remove(image_path)
             raise HTTPException(status_code=400, detail="Ảnh quá sáng. Vui lòng điều chỉnh ánh sáng")
         
-        # 2. Detect faces - use HOG model for faster detection
-        face_locations = face_recognition.face_locations(img, model='hog')
+        # 2. Detect faces - HOG by default for faster detection
+        face_locations = face_recognition.face_locations(img, model=FACE_ENCODING_DETECTOR)
         
         # VALIDATION: Must have exactly 1 face
         if len(face_locations) == 0:
-            os.remove(image_path)
             print("❌ No face found in image")
             raise HTTPException(status_code=400, detail="Không tìm thấy khuôn mặt trong ảnh. Vui lòng đảm bảo khuôn mặt rõ ràng và nhìn thẳng vào camera")
         
         if len(face_locations) > 1:
-            os.remove(image_path)
             print(f"❌ Multiple faces found: {len(face_locations)}")
             raise HTTPException(status_code=400, detail=f"Phát hiện {len(face_locations)} khuôn mặt. Vui lòng đảm bảo chỉ có 1 người trong khung hình")
         
@@ -214,29 +282,32 @@ async def register_face(request: FaceRegisterRequest):
         
         face_area_ratio = (face_width * face_height) / (img_width * img_height)
         if face_area_ratio < 0.05:  # Face takes less than 5% of image
-            os.remove(image_path)
             raise HTTPException(status_code=400, detail="Khuôn mặt quá nhỏ. Vui lòng di chuyển gần camera hơn")
         
         print(f"✅ Image quality check passed (brightness: {mean_brightness:.1f}, face ratio: {face_area_ratio:.2%})")
         
         # Generate face encoding with num_jitters for better accuracy
         print("🔍 Generating face encoding...")
-        encodings = face_recognition.face_encodings(img, known_face_locations=face_locations, num_jitters=2)
+        encodings = face_recognition.face_encodings(img, known_face_locations=face_locations, num_jitters=FACE_ENCODING_JITTERS, model=FACE_ENCODING_MODEL)
         
         if len(encodings) == 0:
-            os.remove(image_path)
             raise HTTPException(status_code=400, detail="Không thể tạo mã hóa khuôn mặt. Vui lòng thử lại")
         
         print(f"✅ Face encoding generated successfully")
         encoding = encodings[0].tolist()  # Convert numpy array to list
         
+        # Content-addressed name; the file and thumbnail are written in the background
+        image_key = image_store.put(image_bytes, cv_img)
+        print(f"💾 Face image queued for storage: {image_key}")
+        
         # Update Firestore
         if db:
             print(f"🔥 Updating Firestore for employee: {request.employeeId}")
             db.collection("employees").document(request.employeeId).update({
                 "faceRegistered": True,
                 "faceEncoding": encoding,
-                "faceImagePath": image_path,
+                "faceEncodingVersion": ENCODING_VERSION,
+                "faceImagePath": image_key,
                 "faceIdCreatedAt": firestore.SERVER_TIMESTAMP
             })
             print("✅ Firestore updated")
@@ -246,8 +317,10 @@ async def register_face(request: FaceRegisterRequest):
         known_face_metadata[request.employeeId] = {
             "fullName": request.employeeName,
             "position": "",
-            "avatarUrl": ""
+            "avatarUrl": "",
+            "encodingVersion": ENCODING_VERSION
         }
+        invalidate_unregistered_cache()
         print("✅ In-memory storage updated")
         
         return {
@@ -256,7 +329,8 @@ async def register_face(request: FaceRegisterRequest):
             "data": {
                 "employeeId": request.employeeId,
                 "employeeName": request.employeeName,
-                "imagePath": image_path,
+                "imagePath": image_key,
+                "thumbnailUrl": f"/face/images/thumbs/{image_key}",
                 "faceQuality": {
                     "brightness": round(float(mean_brightness), 2),
                     "faceAreaRatio": round(float(face_area_ratio), 4)
@@ -276,6 +350,8 @@ async def register_face(request: FaceRegisterRequest):
 @app.post("/face/recognize")
 async def recognize_face(request: FaceRecognizeRequest):
     """Recognize a face from an image"""
+    import face_recognition
+    
     try:
         # Save temporary image
         temp_filename = f"temp_{request.employeeId if hasattr(request, 'employeeId') else 'recognition'}_{os.urandom(4).hex()}.jpg"
@@ -370,117 +446,128 @@ async def recognize_face(request: FaceRecognizeRequest):
 
 
 @app.post("/face/checkin")
-async def process_checkin(request: CheckinRequest):
-    """Process face check-in/checkout"""
+def process_checkin(request: CheckinRequest):
+    """Process face check-in/checkout
+
+    Employee and schedule checks use the caches kept fresh by Firestore
+    listeners; check-ins made at other kiosks are looked up with a short
+    timeout and no retry. Once the record is in the local write-ahead queue
+    the kiosk gets its answer; replication to `employee_checkins` happens in
+    the background and never overwrites a check-in stored by another server.
+    """
     try:
         print(f"📥 Received checkin/checkout request for: {request.employeeId}, type: {request.checkinType}")
         
-        # Get employee info from Firestore
-        if not db:
-            raise HTTPException(status_code=500, detail="Firestore not initialized")
-        
-        emp_doc = db.collection("employees").document(request.employeeId).get()
-        if not emp_doc.exists:
-            raise HTTPException(status_code=404, detail="Không tìm thấy nhân viên")
-        
-        emp_data = emp_doc.to_dict()
-        
-        # Get current date (YYYY-MM-DD)
         from datetime import datetime
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        
-        # Check if employee has schedule for today
-        print(f"🔍 Checking schedule for employee {request.employeeId} on {current_date}")
+        now = datetime.now()
+        current_date = now.strftime("%Y-%m-%d")
+        timestamp = request.timestamp or now.isoformat()
+        checkin_id = make_checkin_id(request.employeeId, request.checkinType, current_date)
+        action_text = "check-in" if request.checkinType == "checkin" else "checkout"
+        
+        # Checks that could not be completed because the caches were never synced
+        offline_checks = []
+        
+        # 1. Employee info from the listener-backed directory
+        emp_data = checkin_directory.employee(request.employeeId)
+        if emp_data is None:
+            if checkin_directory.employees_loaded:
+                raise HTTPException(status_code=404, detail="Không tìm thấy nhân viên")
+            # Directory never synced (Firestore unreachable since startup): fall back to the face gallery
+            emp_data = known_face_metadata.get(request.employeeId)
+            if emp_data is None:
+                raise HTTPException(status_code=503, detail="Không thể xác minh nhân viên. Vui lòng thử lại sau")
+            offline_checks.append("employee")
+        
+        # 2. Already checked in/out today? (local queue first, then other kiosks)
+        if checkin_queue.exists(checkin_id):
+            raise HTTPException(status_code=400, detail=f"Bạn đã {action_text} hôm nay rồi!")
+        if db:
+            try:
+                existing_query = db.collection("employee_checkins").where("employeeId", "==", request.employeeId).where("checkinType", "==", request.checkinType).where("date", "==", current_date).limit(1).get(retry=None, timeout=CHECKIN_REMOTE_TIMEOUT)
+            except Exception as e:
+                print(f"⚠️ Duplicate lookup skipped: {e}")
+                offline_checks.append("duplicate")
+            else:
+                if len(existing_query) > 0:
+                    raise HTTPException(status_code=400, detail=f"Bạn đã {action_text} hôm nay rồi!")
+        
+        # 3. Checkout requires a check-in first (remote lookup only if it was made at another kiosk)
+        if request.checkinType == "checkout" and not checkin_queue.exists(make_checkin_id(request.employeeId, "checkin", current_date)):
+            if not db:
+                raise HTTPException(status_code=400, detail="Vui lòng check-in trước khi checkout!")
+            try:
+                checkin_today_query = db.collection("employee_checkins").where("employeeId", "==", request.employeeId).where("checkinType", "==", "checkin").where("date", "==", current_date).limit(1).get(retry=None, timeout=CHECKIN_REMOTE_TIMEOUT)
+            except Exception as e:
+                print(f"⚠️ Check-in lookup skipped: {e}")
+                offline_checks.append("checkin")
+            else:
+                if len(checkin_today_query) == 0:
+                    raise HTTPException(status_code=400, detail="Vui lòng check-in trước khi checkout!")
         
-        # Check if employee is fulltime (always has schedule)
+        # 4. Parttime employees need a schedule for today
         employee_shift = emp_data.get("shift", "")
         print(f"📋 Employee shift: {employee_shift}")
         
         if employee_shift != "fulltime":
-            # For parttime employees, check if they have a schedule for today
-            schedule_query = db.collection("schedule").where("employeeId", "==", request.employeeId).where("date", "==", current_date).where("status", "==", "active").limit(1).get()
-            
-            if len(schedule_query) == 0:
-                raise HTTPException(status_code=400, detail="Bạn không có lịch làm việc hôm nay! Vui lòng liên hệ quản lý để được xếp lịch.")
-            
-            schedule_data = schedule_query[0].to_dict()
-            print(f"✅ Found schedule: {schedule_data.get('startTime')} - {schedule_data.get('endTime')}")
+            schedule_data = checkin_directory.schedule(request.employeeId, current_date)
+            if schedule_data is None:
+                if checkin_directory.schedules_loaded(current_date):
+                    raise HTTPException(status_code=400, detail="Bạn không có lịch làm việc hôm nay! Vui lòng liên hệ quản lý để được xếp lịch.")
+                offline_checks.append("schedule")
+            else:
+                print(f"✅ Found schedule: {schedule_data.get('startTime')} - {schedule_data.get('endTime')}")
         else:
             print("✅ Fulltime employee - always has schedule")
         
-        # Check if already checkin/checkout today
-        checkin_query = db.collection("employee_checkins").where("employeeId", "==", request.employeeId).where("checkinType", "==", request.checkinType).where("date", "==", current_date).limit(1).get()
-        
-        if len(checkin_query) > 0:
-            existing_checkin = checkin_query[0].to_dict()
-            action_text = "check-in" if request.checkinType == "checkin" else "checkout"
-            raise HTTPException(status_code=400, detail=f"Bạn đã {action_text} hôm nay rồi!")
-        
-        # Special check for checkout: must check-in first
-        if request.checkinType == "checkout":
-            checkin_today_query = db.collection("employee_checkins").where("employeeId", "==", request.employeeId).where("checkinType", "==", "checkin").where("date", "==", current_date).limit(1).get()
-            
-            if len(checkin_today_query) == 0:
-                raise HTTPException(status_code=400, detail="Vui lòng check-in trước khi checkout!")
-        
-        # Save check-in/checkout data
+        # Check-in/checkout data (createdAt is set by the replicator)
         checkin_data = {
             "employeeId": request.employeeId,
             "employeeName": emp_data.get("fullName", ""),
             "checkinType": request.checkinType,  # "checkin" or "checkout"
-            "timestamp": request.timestamp,
+            "timestamp": timestamp,
             "date": current_date,
             "status": "success",
-            "createdAt": firestore.SERVER_TIMESTAMP
         }
+        if offline_checks:
+            checkin_data["offlineValidated"] = offline_checks
         
-        print(f"💾 Saving check-in data: {checkin_data}")
-        
-        # Add to employee_checkins collection
-        checkin_ref = db.collection("employee_checkins").document()
-        checkin_id = checkin_ref.id
-        print(f"📝 Created document with ID: {checkin_id}")
-        
-        checkin_ref.set(checkin_data)
-        print(f"✅ Check-in saved successfully with ID: {checkin_id}")
+        time_text = datetime.fromisoformat(timestamp.replace('Z', '+00:00')).strftime('%H:%M')
         
-        # Create notifications
-        print(f"📬 Creating notifications...")
-        
-        # Notification data for admin
+        # Notification for admin
         admin_notif_data = {
+            "_id": f"{checkin_id}_admin",
             "recipientId": "admin",
             "recipientRole": "admin",
             "type": f"employee_{request.checkinType}",
             "title": f"Nhân viên {request.checkinType}",
-            "message": f"{emp_data.get('fullName', '')} đã {request.checkinType} lúc {datetime.fromisoformat(request.timestamp.replace('Z', '+00:00')).strftime('%H:%M')}",
+            "message": f"{emp_data.get('fullName', '')} đã {request.checkinType} lúc {time_text}",
             "relatedId": checkin_id,
             "relatedType": request.checkinType,
             "senderName": emp_data.get("fullName", ""),
             "senderAvatar": emp_data.get("avatarUrl", None),
-            "read": False,
-            "createdAt": firestore.SERVER_TIMESTAMP
+            "read": False
         }
         
-        # Notification data for PT (confirmation)
+        # Notification for PT (confirmation)
         pt_notif_data = {
+            "_id": f"{checkin_id}_pt",
             "recipientId": request.employeeId,
             "recipientRole": "pt",
             "type": f"{request.checkinType}_confirmation",
             "title": f"{request.checkinType.capitalize()} thành công",
-            "message": f"Bạn đã {request.checkinType} thành công lúc {datetime.fromisoformat(request.timestamp.replace('Z', '+00:00')).strftime('%H:%M')}",
+            "message": f"Bạn đã {request.checkinType} thành công lúc {time_text}",
             "relatedId": checkin_id,
             "relatedType": request.checkinType,
             "senderName": "Hệ thống",
             "senderAvatar": None,
-            "read": False,
-            "createdAt": firestore.SERVER_TIMESTAMP
+            "read": False
         }
         
-        # Save notifications
-        db.collection("notifications").add(admin_notif_data)
-        db.collection("notifications").add(pt_notif_data)
-        print(f"✅ Notifications created for admin and PT")
+        print(f"💾 Queueing check-in data: {checkin_data}")
+        if not checkin_queue.enqueue(checkin_id, checkin_data, [admin_notif_data, pt_notif_data]):
+            raise HTTPException(status_code=400, detail=f"Bạn đã {action_text} hôm nay rồi!")
+        print(f"✅ Check-in queued with ID: {checkin_id}")
         
         action_text = "Check-in" if request.checkinType == "checkin" else "Checkout"
         
@@ -492,7 +579,7 @@ async def process_checkin(request: CheckinRequest):
                 "employeeId": request.employeeId,
                 "employeeName": emp_data.get("fullName", ""),
                 "checkinType": request.checkinType,
-                "timestamp": request.timestamp,
+                "timestamp": timestamp,
                 "date": current_date,
                 "status": "success"
             }
@@ -507,9 +594,209 @@ async def process_checkin(request: CheckinRequest):
         raise HTTPException(status_code=500, detail=f"Lỗi check-in: {str(e)}")
 
 
+MONTH_PATTERN = re.compile(r"^\d{4}-\d{2}$")
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+@app.get("/face/attendance/report")
+async def get_attendance_report(month: Optional[str] = None, date: Optional[str] = None,
+                                employeeId: Optional[str] = None, includeDays: bool = False):
+    """Attendance report (worked minutes, late days) read from rollups only"""
+    try:
+        if not db:
+            raise HTTPException(status_code=500, detail="Firestore not initialized")
+        
+        if date:
+            if not DATE_PATTERN.match(date):
+                raise HTTPException(status_code=400, detail="Ngày phải có định dạng YYYY-MM-DD")
+            rows = attendance_rollups.daily_report(date, employeeId)
+        else:
+            month = month or time.strftime("%Y-%m")
+            if not MONTH_PATTERN.match(month):
+                raise HTTPException(status_code=400, detail="Tháng phải có định dạng YYYY-MM")
+            rows = attendance_rollups.monthly_report(month, employeeId, includeDays)
+        
+        return {
+            "success": True,
+            "month": None if date else month,
+            "date": date,
+            "count": len(rows),
+            "rows": rows
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error in get_attendance_report: {type(e).__name__}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Lỗi báo cáo chấm công: {str(e)}")
+
+
+@app.post("/face/attendance/backfill")
+async def start_attendance_backfill(startMonth: str, endMonth: Optional[str] = None):
+    """Rebuild attendance rollups from employee_checkins (runs in the background)"""
+    if not db:
+        raise HTTPException(status_code=500, detail="Firestore not initialized")
+    
+    endMonth = endMonth or startMonth
+    if not MONTH_PATTERN.match(startMonth) or not MONTH_PATTERN.match(endMonth) or startMonth > endMonth:
+        raise HTTPException(status_code=400, detail="startMonth/endMonth phải có định dạng YYYY-MM và startMonth <= endMonth")
+    if attendance_rollups.backfill_state.get("running"):
+        raise HTTPException(status_code=409, detail="Backfill đang chạy")
+    
+    months = []
+    year, mon = int(startMonth[:4]), int(startMonth[5:])
+    while f"{year:04d}-{mon:02d}" <= endMonth:
+        months.append(f"{year:04d}-{mon:02d}")
+        year, mon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    
+    def run():
+        try:
+            attendance_rollups.backfill(months)
+        except Exception as e:
+            print(f"❌ Attendance backfill error: {e}")
+    
+    threading.Thread(target=run, name="attendance-backfill", daemon=True).start()
+    
+    return {
+        "success": True,
+        "message": f"Đang tính lại chấm công cho {len(months)} tháng",
+        "months": months
+    }
+
+
+@app.get("/face/attendance/backfill")
+async def get_attendance_backfill_status():
+    """Progress of the last attendance backfill"""
+    return {"success": True, "data": attendance_rollups.backfill_state}
+
+
+def swap_face_gallery(migrated: Dict[str, List[float]], snapshot: Dict):
+    """Swap re-encoded templates into the live gallery.
+
+    Keys are assigned in place (never replacing the dict), so registrations
+    and deletions made meanwhile are kept.
+    """
+    swapped = 0
+    for emp_id, encoding in migrated.items():
+        # Skip employees re-registered (or deleted) while the migration ran
+        current = known_face_encodings.get(emp_id)
+        if current is not None and current is snapshot.get(emp_id):
+            known_face_encodings[emp_id] = np.array(encoding)
+            if emp_id in known_face_metadata:
+                known_face_metadata[emp_id]["encodingVersion"] = ENCODING_VERSION
+            swapped += 1
+    
+    print(f"🔁 Face gallery swapped: {swapped} encoding(s) updated to {ENCODING_VERSION}")
+
+
+@app.post("/face/encodings/migrate")
+async def start_encoding_migration(workers: int = 2, ratePerSecond: float = 5.0, batchSize: int = 50):
+    """Re-encode stored face images with the current encoder settings (background job)"""
+    from firebase_admin import firestore
+    
+    if not db:
+        raise HTTPException(status_code=500, detail="Firestore not initialized")
+    if encoding_migration.state.get("running"):
+        raise HTTPException(status_code=409, detail="Migration đang chạy")
+    if not 1 <= workers <= (os.cpu_count() or 1) or ratePerSecond <= 0 or not 1 <= batchSize <= 400:
+        raise HTTPException(status_code=400, detail="Tham số không hợp lệ (workers, ratePerSecond, batchSize)")
+    
+    snapshot = dict(known_face_encodings)
+    
+    def run():
+        try:
+            encoding_migration.run(
+                server_timestamp=firestore.SERVER_TIMESTAMP,
+                workers=workers,
+                rate_per_second=ratePerSecond,
+                batch_size=batchSize,
+                is_current=lambda emp_id: known_face_encodings.get(emp_id) is snapshot.get(emp_id),
+                on_complete=lambda migrated: swap_face_gallery(migrated, snapshot),
+            )
+        except Exception as e:
+            print(f"❌ Encoding migration error: {e}")
+    
+    threading.Thread(target=run, name="encoding-migration", daemon=True).start()
+    
+    return {
+        "success": True,
+        "message": f"Đang mã hóa lại khuôn mặt theo phiên bản {ENCODING_VERSION}",
+        "version": ENCODING_VERSION
+    }
+
+
+@app.get("/face/encodings/migrate")
+async def get_encoding_migration_status():
+    """Progress of the current/last re-encoding migration"""
+    return {"success": True, "data": encoding_migration.state}
+
+
+@app.delete("/face/encodings/migrate")
+async def stop_encoding_migration():
+    """Stop the running migration after the current images (it can be resumed later)"""
+    encoding_migration.stop()
+    return {"success": True, "message": "Đã yêu cầu dừng migration"}
+
+
+def require_admin(token: Optional[str]):
+    """Admin endpoints need X-Admin-Token matching FACE_ADMIN_TOKEN (disabled when unset)"""
+    expected = os.getenv("FACE_ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints chưa được bật (FACE_ADMIN_TOKEN)")
+    if not token or not hmac.compare_digest(token, expected):
+        raise HTTPException(status_code=401, detail="Admin token không hợp lệ")
+
+
+@app.post("/face/profile/start")
+async def start_profiling(seconds: Optional[float] = 30.0, requests: Optional[int] = None,
+                          intervalMs: float = 5.0, x_admin_token: Optional[str] = Header(None)):
+    """Sample all threads for the next `requests` requests and/or `seconds` seconds"""
+    require_admin(x_admin_token)
+    
+    if not seconds and not requests:
+        raise HTTPException(status_code=400, detail="Cần ít nhất seconds hoặc requests")
+    if (seconds and not 0 < seconds <= 600) or (requests and requests < 1) or not 1 <= intervalMs <= 1000:
+        raise HTTPException(status_code=400, detail="Tham số không hợp lệ (seconds <= 600, requests >= 1, 1 <= intervalMs <= 1000)")
+    
+    try:
+        profiler.start(duration=seconds or None, max_requests=requests, interval=intervalMs / 1000)
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="Profiling đang chạy")
+    
+    print(f"🧪 Profiling started (seconds={seconds}, requests={requests}, interval={intervalMs}ms)")
+    return {"success": True, "data": profiler.status()}
+
+
+@app.post("/face/profile/stop")
+async def stop_profiling(x_admin_token: Optional[str] = Header(None)):
+    """Stop the running capture early"""
+    require_admin(x_admin_token)
+    profiler.stop()
+    return {"success": True, "data": profiler.status()}
+
+
+@app.get("/face/profile")
+async def get_profile(format: str = "summary", x_admin_token: Optional[str] = Header(None)):
+    """Last capture: per-function summary (default) or collapsed stacks (format=collapsed)"""
+    require_admin(x_admin_token)
+    
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    
+    return {
+        "success": True,
+        "data": {
+            **profiler.status(),
+            "functions": profiler.summary(PROFILE_TARGETS)
+        }
+    }
+
+
 @app.delete("/face/delete/{employeeId}")
 async def delete_face_id(employeeId: str):
     """Delete face ID for an employee"""
+    from firebase_admin import firestore
+    
     try:
         print(f"📥 Received delete face ID request for: {employeeId}")
         
@@ -525,10 +812,14 @@ async def delete_face_id(employeeId: str):
         
         # Delete face image file if exists
         face_image_path = emp_data.get("faceImagePath")
-        if face_image_path and os.path.exists(face_image_path):
+        image_deleted = False
+        # Legacy absolute paths are per-employee files; content-addressed images
+        # may be shared and are removed by /face/images/gc once unreferenced
+        if face_image_path and os.path.isabs(face_image_path):
             try:
-                os.remove(face_image_path)
-                print(f"🗑️ Deleted face image: {face_image_path}")
+                image_deleted = image_store.delete(face_image_path)
+                if image_deleted:
+                    print(f"🗑️ Deleted face image: {face_image_path}")
             except Exception as e:
                 print(f"⚠️ Could not delete face image: {str(e)}")
         
@@ -536,6 +827,7 @@ async def delete_face_id(employeeId: str):
         update_data = {
             "faceRegistered": False,
             "faceEncoding": firestore.DELETE_FIELD,
+            "faceEncodingVersion": firestore.DELETE_FIELD,
             "faceImagePath": firestore.DELETE_FIELD,
             "faceIdCreatedAt": firestore.DELETE_FIELD
         }
@@ -550,6 +842,7 @@ async def delete_face_id(employeeId: str):
             del known_face_metadata[employeeId]
             print(f"🗑️ Removed from known_face_metadata")
         
+        invalidate_unregistered_cache()
         print(f"✅ Face ID deleted successfully for: {employeeId}")
         
         return {
@@ -558,7 +851,7 @@ async def delete_face_id(employeeId: str):
             "data": {
                 "employeeId": employeeId,
                 "employeeName": emp_data.get("fullName", ""),
-                "imageDeleted": face_image_path is not None
+                "imageDeleted": image_deleted
             }
         }
         
@@ -571,38 +864,183 @@ async def delete_face_id(employeeId: str):
         raise HTTPException(status_code=500, detail=f"Lỗi xóa Face ID: {str(e)}")
 
 
-@app.get("/face/employees/unregistered")
-async def get_unregistered_employees():
-    """Get list of employees without face registration"""
+IMAGE_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}\.jpg$")
+
+
+def _image_response(path: str, key: str):
+    if not IMAGE_KEY_PATTERN.match(key):
+        raise HTTPException(status_code=400, detail="Tên ảnh không hợp lệ")
+    try:
+        image_store.wait(key, timeout=10)
+    except Exception as e:
+        print(f"⚠️ Face image {key} unavailable: {e}")
+        raise HTTPException(status_code=404, detail="Không tìm thấy ảnh")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Không tìm thấy ảnh")
+    # Content-addressed: the bytes behind a key never change
+    return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+@app.get("/face/images/{key}")
+def get_face_image(key: str):
+    """Serve a stored face image"""
+    return _image_response(image_store.path(key), key)
+
+
+@app.get("/face/images/thumbs/{key}")
+def get_face_thumbnail(key: str):
+    """Serve a face image thumbnail (admin UI)"""
+    return _image_response(image_store.thumbnail_path(key), key)
+
+
+@app.post("/face/images/gc")
+async def collect_face_image_garbage(dryRun: bool = False):
+    """Delete face images that no employee document references"""
     try:
         if not db:
             raise HTTPException(status_code=500, detail="Firestore not initialized")
         
-        employees_ref = db.collection("employees").where("faceRegistered", "==", False)
-        docs = employees_ref.stream()
+        referenced = []
+        for doc in db.collection("employees").select(["faceImagePath"]).stream():
+            path = (doc.to_dict() or {}).get("faceImagePath")
+            if path:
+                referenced.append(path)
         
-        employees = []
-        for doc in docs:
-            emp_data = doc.to_dict()
-            employees.append({
-                "_id": doc.id,
-                "fullName": emp_data.get("fullName", ""),
-                "position": emp_data.get("position", ""),
-                "avatarUrl": emp_data.get("avatarUrl", ""),
-                "faceRegistered": False
-            })
+        result = image_store.collect_garbage(referenced, dry_run=dryRun)
+        print(f"🧹 Face image GC: {result['count']} file(s), {result['freedBytes']} bytes (dryRun={dryRun})")
+        
+        return {
+            "success": True,
+            "data": result
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error in collect_face_image_garbage: {type(e).__name__}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Lỗi dọn ảnh: {str(e)}")
+
+
+def _unregistered_employee(doc) -> Dict:
+    emp_data = doc.to_dict() or {}
+    return {
+        "_id": doc.id,
+        "fullName": emp_data.get("fullName", ""),
+        "position": emp_data.get("position", ""),
+        "avatarUrl": emp_data.get("avatarUrl", ""),
+        "faceRegistered": False
+    }
+
+
+def _unregistered_query(limit: Optional[int], cursor: Optional[str]):
+    """Unregistered employees ordered by document id, projected to the listed fields"""
+    employees_ref = db.collection("employees")
+    query = employees_ref.where("faceRegistered", "==", False).select(UNREGISTERED_FIELDS).order_by("__name__")
+    if cursor:
+        query = query.start_after({"__name__": employees_ref.document(cursor)})
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def _cached_unregistered(cache_key):
+    """(cached page or None, current cache generation)"""
+    with unregistered_cache_lock:
+        cached = unregistered_cache.get(cache_key)
+        if cached and cached[0] < time.time():
+            unregistered_cache.pop(cache_key, None)
+            cached = None
+        return cached, unregistered_cache_state["generation"]
+
+
+def _cache_unregistered(cache_key, generation: int, employees: List[Dict], next_cursor: Optional[str]):
+    now = time.time()
+    with unregistered_cache_lock:
+        # Invalidated while this page was being read
+        if generation != unregistered_cache_state["generation"]:
+            return
+        # Sweep expired pages, then evict the oldest if still at capacity
+        for key in [k for k, entry in unregistered_cache.items() if entry[0] < now]:
+            unregistered_cache.pop(key, None)
+        while len(unregistered_cache) >= UNREGISTERED_CACHE_MAX_ENTRIES:
+            unregistered_cache.pop(min(unregistered_cache, key=lambda k: unregistered_cache[k][0]), None)
+        unregistered_cache[cache_key] = (now + UNREGISTERED_CACHE_TTL, employees, next_cursor)
+
+
+def _valid_document_id(doc_id: str) -> bool:
+    """Firestore document id rules: no '/', not '.'/'..', not __reserved__, <= 1500 bytes"""
+    return (
+        bool(doc_id)
+        and "/" not in doc_id
+        and doc_id not in (".", "..")
+        and not (doc_id.startswith("__") and doc_id.endswith("__"))
+        and len(doc_id.encode("utf-8")) <= 1500
+    )
+
+
+def invalidate_unregistered_cache():
+    with unregistered_cache_lock:
+        unregistered_cache.clear()
+        unregistered_cache_state["generation"] += 1
+
+
+@app.get("/face/employees/unregistered")
+async def get_unregistered_employees(limit: Optional[int] = None, cursor: Optional[str] = None, format: str = "json"):
+    """Get list of employees without face registration
+
+    - limit/cursor: page size and the last `_id` of the previous page (omit limit for all)
+    - format=ndjson: stream one employee per line, followed by a `_meta` line
+    """
+    try:
+        if not db:
+            raise HTTPException(status_code=500, detail="Firestore not initialized")
+        if limit is not None and not 1 <= limit <= UNREGISTERED_MAX_PAGE_SIZE:
+            raise HTTPException(status_code=400, detail=f"limit phải trong khoảng 1-{UNREGISTERED_MAX_PAGE_SIZE}")
+        if cursor is not None and not _valid_document_id(cursor):
+            raise HTTPException(status_code=400, detail="cursor không hợp lệ")
+        
+        cache_key = (limit, cursor)
+        cached, generation = _cached_unregistered(cache_key)
+        
+        if format == "ndjson":
+            def stream_lines():
+                if cached:
+                    employees, next_cursor = cached[1], cached[2]
+                    for employee in employees:
+                        yield json.dumps(employee, ensure_ascii=False) + "\n"
+                else:
+                    employees = []
+                    for doc in _unregistered_query(limit, cursor).stream():
+                        employee = _unregistered_employee(doc)
+                        employees.append(employee)
+                        yield json.dumps(employee, ensure_ascii=False) + "\n"
+                    next_cursor = employees[-1]["_id"] if limit and len(employees) == limit else None
+                    _cache_unregistered(cache_key, generation, employees, next_cursor)
+                yield json.dumps({"_meta": {"count": len(employees), "nextCursor": next_cursor}}) + "\n"
+            
+            return StreamingResponse(stream_lines(), media_type="application/x-ndjson")
+        
+        if cached:
+            employees, next_cursor = cached[1], cached[2]
+        else:
+            employees = [_unregistered_employee(doc) for doc in _unregistered_query(limit, cursor).stream()]
+            next_cursor = employees[-1]["_id"] if limit and len(employees) == limit else None
+            _cache_unregistered(cache_key, generation, employees, next_cursor)
         
         return {
             "success": True,
             "count": len(employees),
-            "employees": employees
+            "employees": employees,
+            "nextCursor": next_cursor
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi lấy danh sách: {str(e)}")
 
 
-async def load_face_encodings_from_firestore():
+def load_face_encodings_from_firestore():
     """Load all face encodings from Firestore on startup"""
     try:
         print("📥 Loading face encodings from Firestore...")
@@ -631,7 +1069,9 @@ async def load_face_encodings_from_firestore():
                     known_face_metadata[emp_id] = {
                         "fullName": emp_data.get("fullName", ""),
                         "position": emp_data.get("position", ""),
-                        "avatarUrl": emp_data.get("avatarUrl", "")
+                        "avatarUrl": emp_data.get("avatarUrl", ""),
+                        "shift": emp_data.get("shift", ""),
+                        "encodingVersion": emp_data.get("faceEncodingVersion")
                     }
                     count += 1
                     print(f"✅ Loaded: {emp_data.get('fullName', emp_id)}")
@@ -646,15 +1086,61 @@ async def load_face_encodings_from_firestore():
         traceback.print_exc()
 
 
+def warm_up():
+    """Background startup: Firebase, face gallery, then one pass of each detector/encoder"""
+    try:
+        init_firebase()
+        startup_state["firebase"] = db is not None
+        if db:
+            checkin_directory.start(db)
+        
+        load_face_encodings_from_firestore()
+        startup_state["gallery"] = True
+        
+        print("🔥 Warming up face models...")
+        import cv2
+        import face_recognition
+        
+        img = None
+        if WARMUP_IMAGE_PATH and os.path.exists(WARMUP_IMAGE_PATH):
+            img = face_recognition.load_image_file(WARMUP_IMAGE_PATH)
+        if img is None:
+            # Synthetic frame: enough to initialize the HOG/CNN detectors and the encoder
+            img = np.zeros((240, 320, 3), dtype=np.uint8)
+            cv2.circle(img, (160, 120), 70, (200, 170, 150), -1)
+        
+        height, width = img.shape[:2]
+        face_recognition.face_locations(img, model='hog')
+        face_recognition.face_locations(img, model='cnn')
+        face_recognition.face_encodings(img, known_face_locations=[(0, width, height, 0)], num_jitters=1)
+        startup_state["models"] = True
+        
+        startup_state["ready"] = True
+        startup_state["readyAt"] = time.time()
+        print(f"✅ Warm-up finished in {startup_state['readyAt'] - startup_state['startedAt']:.1f}s - ready for traffic")
+    except Exception as e:
+        startup_state["error"] = f"{type(e).__name__}: {e}"
+        print(f"❌ Warm-up failed: {startup_state['error']}")
+        import traceback
+        traceback.print_exc()
+
+
 @app.on_event("startup")
 async def startup_event():
     print("🚀 Face Recognition API started")
-    # Load existing face encodings from database
-    await load_face_encodings_from_firestore()
+    startup_state["startedAt"] = time.time()
+    checkin_queue.start()
+    # Load Firebase, face encodings and models without blocking the server from binding
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    checkin_directory.stop()
+    checkin_queue.stop()
+    attendance_rollups.shutdown()
+    image_store.flush()
+    image_store.shutdown()
     print("👋 Face Recognition API stopped")
 
 
@@ -0,0 +1,183 @@
+"""On-demand sampling profiler for the face API.
+
+While a capture is active a background thread snapshots every thread's
+stack (`sys._current_frames`) at a fixed interval: the event loop running
+the handlers, the sync-endpoint thread pool, the image-store writers and the
+check-in replicator. When no capture is running the only cost is one
+attribute check per request in `ProfilingMiddleware`.
+
+Output is collapsed stacks (`frame;frame;frame count`, the input format of
+flamegraph.pl / speedscope) plus a per-function summary.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Frame = Tuple[str, str]  # (file name, function name)
+
+
+def _frame_label(frame: Frame) -> str:
+    return f"{frame[1]} ({frame[0]})"
+
+
+class SamplingProfiler:
+    """Stack sampler limited to N requests and/or T seconds"""
+
+    def __init__(self):
+        self.active = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._reset(0.0, None, None)
+
+    def _reset(self, interval: float, duration: Optional[float], max_requests: Optional[int]):
+        self.interval = interval
+        self.duration = duration
+        self.max_requests = max_requests
+        self.requests = 0
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+
+    # ---- control ----------------------------------------------------------
+
+    def start(self, duration: Optional[float] = 30.0, max_requests: Optional[int] = None,
+              interval: float = 0.005):
+        with self._lock:
+            if self.active:
+                raise RuntimeError("Profiling is already running")
+            self._reset(interval, duration, max_requests)
+            self._stop.clear()
+            self.started_at = time.time()
+            self.active = True
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(1.0)
+
+    def request_finished(self):
+        self.requests += 1
+        if self.max_requests and self.requests >= self.max_requests:
+            self._stop.set()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        deadline = self.started_at + self.duration if self.duration else None
+        try:
+            while not self._stop.is_set():
+                if deadline and time.time() >= deadline:
+                    break
+                self._sample(own_id)
+                self._stop.wait(self.interval)
+        finally:
+            self.active = False
+            self.stopped_at = time.time()
+            print(f"🧪 Profiling stopped: {self.sample_count} samples, {self.requests} requests")
+
+    def _sample(self, own_id: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack: List[Frame] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            stack.append(("thread", names.get(thread_id, str(thread_id))))
+            stack.reverse()
+            stacks.append(tuple(stack))
+        with self._lock:
+            for stack in stacks:
+                self.samples[stack] += 1
+            self.sample_count += 1
+
+    # ---- results ----------------------------------------------------------
+
+    def status(self) -> Dict:
+        return {
+            "active": self.active,
+            "startedAt": self.started_at,
+            "stoppedAt": self.stopped_at,
+            "durationLimit": self.duration,
+            "requestLimit": self.max_requests,
+            "requests": self.requests,
+            "samples": self.sample_count,
+            "intervalSeconds": self.interval,
+            "secondsPerSample": round(self.seconds_per_sample(), 6),
+        }
+
+    def _snapshot(self) -> Tuple[Counter, int]:
+        # The sampler keeps adding stacks while a capture is active
+        with self._lock:
+            return Counter(self.samples), self.sample_count
+
+    def collapsed(self) -> str:
+        """Flamegraph-compatible collapsed stacks, one `a;b;c count` per line"""
+        samples, _ = self._snapshot()
+        lines = [
+            ";".join(_frame_label(frame) for frame in stack) + f" {count}"
+            for stack, count in samples.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+    def seconds_per_sample(self, sample_count: Optional[int] = None) -> float:
+        """Measured wall time between samples (stack walking makes it longer than `interval`)"""
+        if sample_count is None:
+            sample_count = self.sample_count
+        if not self.started_at or not sample_count:
+            return self.interval
+        end = self.stopped_at or time.time()
+        return (end - self.started_at) / sample_count
+
+    def summary(self, targets: Iterable[Frame], top: int = 15) -> Dict:
+        """Inclusive samples of each target function, with its hottest callees and leaf frames"""
+        samples, sample_count = self._snapshot()
+        seconds_per_sample = self.seconds_per_sample(sample_count)
+        result = {}
+        for target in targets:
+            inclusive = 0
+            callees: Counter = Counter()
+            leaves: Counter = Counter()
+            for stack, count in samples.items():
+                if target not in stack:
+                    continue
+                inclusive += count
+                index = stack.index(target)
+                if index + 1 < len(stack):
+                    callees[_frame_label(stack[index + 1])] += count
+                leaves[_frame_label(stack[-1])] += count
+            result[target[1]] = {
+                "samples": inclusive,
+                "estimatedSeconds": round(inclusive * seconds_per_sample, 3),
+                "callees": [{"function": name, "samples": n} for name, n in callees.most_common(top)],
+                "selfTime": [{"function": name, "samples": n} for name, n in leaves.most_common(top)],
+            }
+        return result
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware counting requests for request-limited captures"""
+
+    def __init__(self, app, profiler: SamplingProfiler, exclude_prefix: str = "/face/profile"):
+        self.app = app
+        self.profiler = profiler
+        self.exclude_prefix = exclude_prefix
+
+    async def __call__(self, scope, receive, send):
+        if not self.profiler.active or scope["type"] != "http" or scope.get("path", "").startswith(self.exclude_prefix):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.request_finished()
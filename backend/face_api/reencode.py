@@ -0,0 +1,218 @@
+"""Re-encode stored face images when detector/encoder settings change.
+
+Every encoding written to Firestore carries `faceEncodingVersion`. The
+migration walks registered employees whose version differs from the current
+one, re-encodes `faceImagePath` on a process pool, commits the results in
+batches and finally hands the new encodings back so the server can swap its
+in-memory gallery. Already-migrated employees are skipped, so a stopped or
+crashed run simply resumes where it left off. Each write carries a
+`last_update_time` precondition from the initial read, so an employee
+re-registered or deleted mid-run is skipped rather than overwritten.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def encoding_version(detector: str, num_jitters: int, model: str) -> str:
+    """Identifier for the settings an encoding was produced with, e.g. `hog-j2-large`"""
+    return f"{detector}-j{num_jitters}-{model}"
+
+
+def encode_face_image(path: str, detector: str, num_jitters: int, model: str) -> Tuple[Optional[List[float]], Optional[str]]:
+    """Worker: (encoding, None) on success, (None, reason) otherwise"""
+    import face_recognition
+
+    if not os.path.exists(path):
+        return None, "image not found"
+    img = face_recognition.load_image_file(path)
+    locations = face_recognition.face_locations(img, model=detector)
+    if len(locations) != 1:
+        return None, f"{len(locations)} faces found"
+    encodings = face_recognition.face_encodings(img, known_face_locations=locations, num_jitters=num_jitters, model=model)
+    if not encodings:
+        return None, "encoding failed"
+    return encodings[0].tolist(), None
+
+
+class EncodingMigration:
+    """Background re-encoding job (one run at a time)"""
+
+    def __init__(self, db, resolve_path: Callable[[str], str], detector: str = "hog",
+                 num_jitters: int = 2, model: str = "large"):
+        self.db = db
+        self.resolve_path = resolve_path
+        self.detector = detector
+        self.num_jitters = num_jitters
+        self.model = model
+        self.version = encoding_version(detector, num_jitters, model)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.state: Dict = {"running": False}
+        # employeeId -> update_time seen by _targets (write precondition)
+        self._update_times: Dict = {}
+
+    def stop(self):
+        self._stop.set()
+
+    def _targets(self) -> List[Tuple[str, str]]:
+        """(employeeId, image path) of registered employees not on the current version"""
+        targets = []
+        query = self.db.collection("employees").where("faceRegistered", "==", True).select(["faceImagePath", "faceEncodingVersion"])
+        for doc in query.stream():
+            data = doc.to_dict() or {}
+            if data.get("faceEncodingVersion") == self.version:
+                continue
+            if not data.get("faceImagePath"):
+                self.state["skipped"][doc.id] = "no faceImagePath"
+                continue
+            self._update_times[doc.id] = doc.update_time
+            targets.append((doc.id, self.resolve_path(data["faceImagePath"])))
+        return targets
+
+    def _is_precondition_error(self, error: Exception) -> bool:
+        try:
+            from google.api_core.exceptions import FailedPrecondition
+        except ImportError:
+            return False
+        return isinstance(error, FailedPrecondition)
+
+    def run(self, server_timestamp=None, workers: int = 2, rate_per_second: float = 5.0,
+            batch_size: int = 50, is_current: Optional[Callable[[str], bool]] = None,
+            on_complete: Optional[Callable[[Dict[str, List[float]]], None]] = None) -> Dict:
+        """Re-encode all outdated employees.
+
+        is_current(employeeId) is checked when an encoding finishes and again
+        right before its batch commits; on_complete receives the new
+        encodings once all batches are committed.
+        """
+        with self._lock:
+            if self.state.get("running"):
+                raise RuntimeError("Migration is already running")
+            self._stop.clear()
+            self._update_times = {}
+            self.state = {
+                "running": True, "version": self.version, "total": 0, "processed": 0,
+                "migrated": 0, "failed": {}, "skipped": {}, "startedAt": time.time(),
+            }
+
+        migrated: Dict[str, List[float]] = {}
+        pending_writes: List[Tuple[str, List[float]]] = []
+
+        def write_args(employee_id: str, encoding: List[float]):
+            ref = self.db.collection("employees").document(employee_id)
+            data = {
+                "faceEncoding": encoding,
+                "faceEncodingVersion": self.version,
+                "faceEncodingUpdatedAt": server_timestamp,
+            }
+            # Fails if the document changed since _targets read it
+            option = self.db.write_option(last_update_time=self._update_times[employee_id])
+            return ref, data, option
+
+        def commit():
+            writes = []
+            for employee_id, encoding in pending_writes:
+                if is_current and not is_current(employee_id):
+                    self.state["skipped"][employee_id] = "re-registered during migration"
+                else:
+                    writes.append((employee_id, encoding))
+            pending_writes.clear()
+            if not writes:
+                return
+
+            batch = self.db.batch()
+            for employee_id, encoding in writes:
+                batch.update(*write_args(employee_id, encoding))
+            try:
+                batch.commit()
+                committed = writes
+            except Exception as e:
+                if not self._is_precondition_error(e):
+                    raise
+                # Someone changed at least one document: write one by one, skip the changed ones
+                committed = []
+                for employee_id, encoding in writes:
+                    ref, data, option = write_args(employee_id, encoding)
+                    try:
+                        ref.update(data, option=option)
+                        committed.append((employee_id, encoding))
+                    except Exception as single_error:
+                        if not self._is_precondition_error(single_error):
+                            raise
+                        self.state["skipped"][employee_id] = "changed during migration"
+
+            for employee_id, encoding in committed:
+                migrated[employee_id] = encoding
+            self.state["migrated"] = len(migrated)
+
+        try:
+            targets = self._targets()
+            self.state["total"] = len(targets)
+            print(f"🔄 Re-encoding {len(targets)} face(s) to {self.version} ({workers} workers, {rate_per_second}/s)")
+
+            interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+            next_submit = time.monotonic()
+            in_flight = {}
+
+            # spawn: dlib is not fork-safe inside a threaded server process
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                queue = list(targets)
+                while (queue or in_flight) and not self._stop.is_set():
+                    # Submit while under the in-flight bound and the rate limit
+                    while queue and len(in_flight) < workers * 2:
+                        delay = next_submit - time.monotonic()
+                        if delay > 0:
+                            if self._stop.wait(delay):
+                                break
+                        employee_id, path = queue.pop(0)
+                        future = executor.submit(encode_face_image, path, self.detector, self.num_jitters, self.model)
+                        in_flight[future] = employee_id
+                        next_submit = max(next_submit, time.monotonic()) + interval
+
+                    if not in_flight:
+                        continue
+                    done, _ = wait(list(in_flight), timeout=1.0, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        employee_id = in_flight.pop(future)
+                        self.state["processed"] += 1
+                        try:
+                            encoding, error = future.result()
+                        except Exception as e:
+                            encoding, error = None, f"{type(e).__name__}: {e}"
+                        if error:
+                            self.state["failed"][employee_id] = error
+                            continue
+                        if is_current and not is_current(employee_id):
+                            self.state["skipped"][employee_id] = "re-registered during migration"
+                            continue
+                        pending_writes.append((employee_id, encoding))
+                        if len(pending_writes) >= batch_size:
+                            commit()
+
+                if self._stop.is_set():
+                    for future in in_flight:
+                        future.cancel()
+            commit()
+
+            if on_complete and migrated:
+                on_complete(migrated)
+
+            self.state["stopped"] = self._stop.is_set()
+            print(f"✅ Re-encoding finished: {len(migrated)} migrated, {len(self.state['failed'])} failed, {len(self.state['skipped'])} skipped")
+        except Exception as e:
+            self.state["error"] = f"{type(e).__name__}: {e}"
+            print(f"❌ Re-encoding failed: {self.state['error']}")
+            # Committed batches are kept; hand them over so the gallery matches Firestore
+            if on_complete and migrated:
+                on_complete(migrated)
+        finally:
+            self.state["running"] = False
+            self.state["finishedAt"] = time.time()
+
+        return self.state
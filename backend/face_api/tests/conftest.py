@@ -0,0 +1,67 @@
+"""Shared fixtures: a minimal in-memory Firestore stand-in."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeDocumentRef:
+    def __init__(self, db, collection, doc_id):
+        self.db = db
+        self.collection = collection
+        self.id = doc_id
+
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeDocumentRef(self.db, self.name, doc_id)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.ops = []
+
+    def set(self, ref, data):
+        self.ops.append((ref.collection, ref.id, dict(data), False))
+
+    def create(self, ref, data):
+        self.ops.append((ref.collection, ref.id, dict(data), True))
+
+    def commit(self):
+        if self.db.fail_commits:
+            self.db.fail_commits -= 1
+            raise ConnectionError("Firestore unreachable")
+        for collection, doc_id, _, create in self.ops:
+            if create and (collection, doc_id) in self.db.docs:
+                from google.api_core.exceptions import AlreadyExists
+                raise AlreadyExists(f"Document already exists: {collection}/{doc_id}")
+        for collection, doc_id, data, _ in self.ops:
+            self.db.docs[(collection, doc_id)] = data
+        self.db.commits += 1
+
+
+class FakeFirestore:
+    """Records batched writes in `docs`; `fail_commits` makes the next N commits fail"""
+
+    def __init__(self):
+        self.docs = {}
+        self.commits = 0
+        self.fail_commits = 0
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+
+@pytest.fixture
+def fake_db():
+    return FakeFirestore()
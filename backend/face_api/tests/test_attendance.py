@@ -0,0 +1,73 @@
+import threading
+
+from attendance import AttendanceRollups, build_daily, build_monthly
+
+
+def test_build_daily_worked_and_late():
+    daily = build_daily("emp1", "A", "2026-10-19", "2026-10-19T09:12:00", "2026-10-19T17:30:00", "09:00")
+
+    assert daily["month"] == "2026-10"
+    assert daily["workedMinutes"] == 498
+    assert daily["late"] is True
+    assert daily["lateMinutes"] == 12
+
+
+def test_build_daily_within_grace_is_not_late():
+    daily = build_daily("emp1", "A", "2026-10-19", "2026-10-19T09:04:00", None, "09:00", late_grace_minutes=5)
+
+    assert daily["late"] is False
+    assert daily["lateMinutes"] == 0
+    assert daily["workedMinutes"] == 0
+
+
+def test_build_daily_early_checkin_and_bad_start():
+    assert build_daily("emp1", "A", "2026-10-19", "2026-10-19T08:30:00", None, "09:00")["late"] is False
+    assert build_daily("emp1", "A", "2026-10-19", "2026-10-19T10:00:00", None, "9h")["late"] is False
+
+
+def test_build_daily_checkout_before_checkin_clamps_to_zero():
+    daily = build_daily("emp1", "A", "2026-10-19", "2026-10-19T17:00:00", "2026-10-19T09:00:00", None)
+
+    assert daily["workedMinutes"] == 0
+
+
+def test_build_monthly_totals():
+    days = {
+        "2026-10-01": {"firstCheckin": "x", "workedMinutes": 480, "late": False, "lateMinutes": 0},
+        "2026-10-02": {"firstCheckin": "x", "workedMinutes": 450, "late": True, "lateMinutes": 15},
+        "2026-10-03": {"firstCheckin": None, "workedMinutes": 0, "late": False, "lateMinutes": 0},
+    }
+    monthly = build_monthly("emp1", "A", "2026-10", days)
+
+    assert monthly["daysPresent"] == 2
+    assert monthly["workedMinutes"] == 930
+    assert monthly["lateDays"] == 1
+    assert monthly["lateMinutes"] == 15
+    assert monthly["days"] is days
+
+
+def test_checkins_during_rebuild_are_deferred_then_applied():
+    rollups = AttendanceRollups(db=object())
+    applied = []
+    rebuild_started, release_rebuild = threading.Event(), threading.Event()
+
+    def fake_snapshot(month):
+        rebuild_started.set()
+        release_rebuild.wait(5)
+        return {"month": month}
+
+    rollups.apply_checkin = applied.append
+    rollups._rebuild_month_snapshot = fake_snapshot
+
+    worker = threading.Thread(target=rollups._rebuild_month, args=("2026-10",))
+    worker.start()
+    rebuild_started.wait(5)
+
+    rollups.apply_checkins([{"employeeId": "emp1", "date": "2026-10-19"}, {"employeeId": "emp2", "date": "2026-11-01"}])
+    rollups._executor.submit(lambda: None).result(5)
+    assert [c["employeeId"] for c in applied] == ["emp2"]
+
+    release_rebuild.set()
+    worker.join(5)
+    rollups.shutdown()
+    assert [c["employeeId"] for c in applied] == ["emp2", "emp1"]
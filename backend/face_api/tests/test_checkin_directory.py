@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+from checkin_directory import CheckinDirectory
+
+
+def _change(kind, doc_id, data):
+    document = SimpleNamespace(id=doc_id, to_dict=lambda: data)
+    return SimpleNamespace(type=SimpleNamespace(name=kind), document=document)
+
+
+def test_employee_changes_update_and_remove():
+    directory = CheckinDirectory()
+    assert not directory.employees_loaded
+
+    directory.apply_employee_changes([_change("ADDED", "emp1", {"fullName": "A", "shift": "parttime"})])
+    assert directory.employees_loaded
+    assert directory.employee("emp1")["shift"] == "parttime"
+
+    directory.apply_employee_changes([_change("MODIFIED", "emp1", {"fullName": "A", "shift": "fulltime"})])
+    assert directory.employee("emp1")["shift"] == "fulltime"
+
+    directory.apply_employee_changes([_change("REMOVED", "emp1", {})])
+    assert directory.employee("emp1") is None
+
+
+def test_schedule_changes_for_watched_date_only():
+    directory = CheckinDirectory()
+    directory._watch_date = "2026-10-19"
+    assert not directory.schedules_loaded("2026-10-19")
+
+    directory.apply_schedule_changes("2026-10-19", [_change("ADDED", "s1", {"employeeId": "emp1", "startTime": "08:00"})])
+    directory.apply_schedule_changes("2026-10-18", [_change("ADDED", "s2", {"employeeId": "emp2", "startTime": "08:00"})])
+
+    assert directory.schedules_loaded("2026-10-19")
+    assert directory.schedule("emp1", "2026-10-19")["startTime"] == "08:00"
+    assert directory.schedule("emp2", "2026-10-18") is None
+
+    directory.apply_schedule_changes("2026-10-19", [_change("REMOVED", "s1", {"employeeId": "emp1"})])
+    assert directory.schedule("emp1", "2026-10-19") is None
@@ -0,0 +1,136 @@
+import pytest
+
+from checkin_queue import CheckinQueue, make_checkin_id
+
+
+def _checkin(employee_id="emp1", checkin_type="checkin", date="2026-10-19"):
+    return {
+        "employeeId": employee_id,
+        "employeeName": "Nguyen Van A",
+        "checkinType": checkin_type,
+        "timestamp": f"{date}T09:00:00",
+        "date": date,
+        "status": "success",
+    }
+
+
+def _queue(tmp_path, db, **kwargs):
+    return CheckinQueue(str(tmp_path / "wal.sqlite3"), db=db, server_timestamp="SERVER_TS", **kwargs)
+
+
+def test_make_checkin_id_is_deterministic():
+    assert make_checkin_id("emp1", "checkin", "2026-10-19") == "emp1_2026-10-19_checkin"
+
+
+def test_enqueue_rejects_duplicates(tmp_path, fake_db):
+    queue = _queue(tmp_path, fake_db)
+    checkin_id = make_checkin_id("emp1", "checkin", "2026-10-19")
+
+    assert queue.enqueue(checkin_id, _checkin(), [])
+    assert queue.exists(checkin_id)
+    assert not queue.enqueue(checkin_id, _checkin(), [])
+    assert queue.stats()["pending"] == 1
+
+
+def test_replicate_after_failed_commit(tmp_path, fake_db):
+    queue = _queue(tmp_path, fake_db)
+    checkin_id = make_checkin_id("emp1", "checkin", "2026-10-19")
+    queue.enqueue(checkin_id, _checkin(), [{"_id": f"{checkin_id}_admin", "recipientId": "admin"}])
+
+    fake_db.fail_commits = 1
+    try:
+        queue.replicate_once()
+        assert False, "commit should have failed"
+    except ConnectionError:
+        pass
+    stats = queue.stats()
+    assert stats["pending"] == 1
+    assert "ConnectionError" in stats["last_error"]
+    assert fake_db.docs == {}
+
+    assert queue.replicate_once() == 1
+    assert queue.stats()["pending"] == 0
+    assert queue.stats()["last_error"] is None
+    checkin_doc = fake_db.docs[("employee_checkins", checkin_id)]
+    assert checkin_doc["employeeId"] == "emp1"
+    assert checkin_doc["createdAt"] == "SERVER_TS"
+    notification = fake_db.docs[("notifications", f"{checkin_id}_admin")]
+    assert notification == {"recipientId": "admin", "createdAt": "SERVER_TS"}
+
+
+def test_replicate_in_batches(tmp_path, fake_db):
+    queue = _queue(tmp_path, fake_db, batch_size=2)
+    for i in range(5):
+        queue.enqueue(make_checkin_id(f"emp{i}", "checkin", "2026-10-19"), _checkin(f"emp{i}"), [])
+
+    assert queue.replicate_once() == 2
+    assert queue.replicate_once() == 2
+    assert queue.replicate_once() == 1
+    assert queue.replicate_once() == 0
+    assert fake_db.commits == 3
+    assert queue.stats()["replicated_total"] == 5
+
+
+def test_replicated_rows_still_block_duplicates(tmp_path, fake_db):
+    queue = _queue(tmp_path, fake_db)
+    checkin_id = make_checkin_id("emp1", "checkin", "2026-10-19")
+    queue.enqueue(checkin_id, _checkin(), [])
+    queue.replicate_once()
+
+    assert not queue.enqueue(checkin_id, _checkin(), [])
+
+
+def test_queue_survives_reopen(tmp_path, fake_db):
+    checkin_id = make_checkin_id("emp1", "checkin", "2026-10-19")
+    _queue(tmp_path, None).enqueue(checkin_id, _checkin(), [])
+
+    reopened = _queue(tmp_path, fake_db)
+    assert reopened.stats()["pending"] == 1
+    assert reopened.replicate_once() == 1
+    assert ("employee_checkins", checkin_id) in fake_db.docs
+
+
+def test_on_replicated_receives_checkins(tmp_path, fake_db):
+    received = []
+    queue = _queue(tmp_path, fake_db, on_replicated=received.extend)
+    queue.enqueue(make_checkin_id("emp1", "checkin", "2026-10-19"), _checkin(), [])
+    queue.replicate_once()
+
+    assert [c["employeeId"] for c in received] == ["emp1"]
+    assert "createdAt" not in received[0]
+
+
+def test_checkin_from_another_server_is_not_overwritten(tmp_path, fake_db):
+    pytest.importorskip("google.api_core")
+    received = []
+    queue = _queue(tmp_path, fake_db, on_replicated=received.extend)
+    first_id = make_checkin_id("emp1", "checkin", "2026-10-19")
+    other_id = make_checkin_id("emp2", "checkin", "2026-10-19")
+    # emp1 already checked in at another kiosk, and has read the notification
+    fake_db.docs[("employee_checkins", first_id)] = {"timestamp": "2026-10-19T08:00:00"}
+    fake_db.docs[("notifications", f"{first_id}_admin")] = {"read": True}
+
+    queue.enqueue(first_id, _checkin(), [{"_id": f"{first_id}_admin", "read": False}])
+    queue.enqueue(other_id, _checkin("emp2"), [])
+
+    assert queue.replicate_once() == 2
+    assert fake_db.docs[("employee_checkins", first_id)] == {"timestamp": "2026-10-19T08:00:00"}
+    assert fake_db.docs[("notifications", f"{first_id}_admin")] == {"read": True}
+    assert fake_db.docs[("employee_checkins", other_id)]["employeeId"] == "emp2"
+    assert [c["employeeId"] for c in received] == ["emp2"]
+    stats = queue.stats()
+    assert stats["pending"] == 0
+    assert stats["replicated_total"] == 1
+    assert stats["duplicates_total"] == 1
+
+
+def test_batches_stay_under_firestore_write_limit(tmp_path, fake_db):
+    queue = _queue(tmp_path, fake_db, batch_size=500)
+    for i in range(200):
+        checkin_id = make_checkin_id(f"emp{i}", "checkin", "2026-10-19")
+        notifications = [{"_id": f"{checkin_id}_admin"}, {"_id": f"{checkin_id}_pt"}]
+        queue.enqueue(checkin_id, _checkin(f"emp{i}"), notifications)
+
+    assert queue.replicate_once() == 166
+    assert queue.replicate_once() == 34
+    assert queue.stats()["pending"] == 0
@@ -0,0 +1,67 @@
+import os
+import time
+
+from image_store import ImageStore
+
+
+def _store_with_files(tmp_path, names, age_seconds=7200):
+    store = ImageStore(str(tmp_path / "faces"))
+    old = time.time() - age_seconds
+    for name in names:
+        for path in (store.path(name), store.thumbnail_path(name)):
+            with open(path, "wb") as f:
+                f.write(b"\xff\xd8jpeg")
+            os.utime(path, (old, old))
+    return store
+
+
+def test_collect_garbage_removes_unreferenced(tmp_path):
+    store = _store_with_files(tmp_path, ["a.jpg", "b.jpg"])
+
+    result = store.collect_garbage(["a.jpg"])
+
+    assert sorted(result["removed"]) == ["b.jpg", os.path.join("thumbs", "b.jpg")]
+    assert result["freedBytes"] == 2 * len(b"\xff\xd8jpeg")
+    assert os.path.exists(store.path("a.jpg"))
+    assert os.path.exists(store.thumbnail_path("a.jpg"))
+    assert not os.path.exists(store.path("b.jpg"))
+
+
+def test_collect_garbage_keeps_legacy_absolute_references(tmp_path):
+    store = _store_with_files(tmp_path, ["emp1_1765360651186.jpg"])
+
+    result = store.collect_garbage([store.path("emp1_1765360651186.jpg")])
+
+    assert result["count"] == 0
+
+
+def test_collect_garbage_dry_run(tmp_path):
+    store = _store_with_files(tmp_path, ["b.jpg"])
+
+    result = store.collect_garbage([], dry_run=True)
+
+    assert result["count"] == 2
+    assert os.path.exists(store.path("b.jpg"))
+
+
+def test_collect_garbage_respects_grace_period(tmp_path):
+    store = _store_with_files(tmp_path, ["new.jpg"], age_seconds=10)
+
+    assert store.collect_garbage([])["count"] == 0
+
+
+def test_put_of_existing_image_refreshes_grace_period(tmp_path):
+    image_bytes = b"\xff\xd8same-photo"
+    key = ImageStore.key_for(image_bytes)
+    store = _store_with_files(tmp_path, [key])
+
+    assert store.put(image_bytes) == key
+    assert store.collect_garbage([])["count"] == 0
+
+
+def test_collect_garbage_ignores_non_images(tmp_path):
+    store = _store_with_files(tmp_path, [])
+    with open(os.path.join(store.root, "notes.txt"), "w") as f:
+        f.write("keep")
+
+    assert store.collect_garbage([], grace_seconds=0)["count"] == 0
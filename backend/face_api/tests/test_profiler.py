@@ -0,0 +1,77 @@
+import threading
+import time
+
+from profiler import SamplingProfiler
+
+
+def busy_target(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        sum(range(2000))
+
+
+def test_estimated_seconds_uses_measured_sample_rate():
+    profiler = SamplingProfiler()
+    profiler.start(duration=0.6, interval=0.005)
+    worker = threading.Thread(target=busy_target, args=(0.3,))
+    worker.start()
+    worker.join()
+    profiler._thread.join(2)
+
+    assert not profiler.active
+    summary = profiler.summary([("test_profiler.py", "busy_target")])["busy_target"]
+    assert summary["samples"] > 0
+    # Within a generous band of the 0.3s of real busy time
+    assert 0.15 <= summary["estimatedSeconds"] <= 0.6
+
+
+def test_request_limit_stops_capture():
+    profiler = SamplingProfiler()
+    profiler.start(duration=None, max_requests=2, interval=0.005)
+    profiler.request_finished()
+    profiler.request_finished()
+    profiler._thread.join(2)
+
+    assert not profiler.active
+    assert profiler.status()["requests"] == 2
+
+
+def test_collapsed_format():
+    profiler = SamplingProfiler()
+    profiler.samples[(("thread", "MainThread"), ("main.py", "recognize_face"))] = 3
+
+    assert profiler.collapsed() == "MainThread (thread);recognize_face (main.py) 3\n"
+
+
+def varying_stacks(depth, stop):
+    # A different stack depth per call keeps the sampler adding new keys
+    if depth:
+        return varying_stacks(depth - 1, stop)
+    time.sleep(0.0005)
+
+
+def test_results_can_be_read_during_capture():
+    profiler = SamplingProfiler()
+    stop = threading.Event()
+
+    def churn():
+        depth = 0
+        while not stop.is_set():
+            varying_stacks(depth % 200, stop)
+            depth += 1
+
+    worker = threading.Thread(target=churn)
+    worker.start()
+    profiler.start(duration=1.0, interval=0.001)
+    try:
+        deadline = time.time() + 0.5
+        while time.time() < deadline:
+            profiler.summary([("test_profiler.py", "varying_stacks")])
+            profiler.collapsed()
+            profiler.status()
+    finally:
+        profiler.stop()
+        stop.set()
+        worker.join()
+
+    assert profiler.summary([("test_profiler.py", "varying_stacks")])["varying_stacks"]["samples"] > 0
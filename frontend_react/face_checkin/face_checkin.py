@@ -5,6 +5,12 @@ import os
 import face_recognition
 import numpy as np
 
+# Same settings as backend/face_api (FACE_ENCODING_*), recorded as faceEncodingVersion
+ENCODING_DETECTOR = "hog"
+ENCODING_JITTERS = 2
+ENCODING_MODEL = "large"
+ENCODING_VERSION = f"{ENCODING_DETECTOR}-j{ENCODING_JITTERS}-{ENCODING_MODEL}"
+
 # === 1. Kết nối Firestore ===
 cred = credentials.Certificate("gym-managment-aa0a1-firebase-adminsdk-fbsvc-5004fe1cc0.json")
 firebase_admin.initialize_app(cred)
@@ -55,7 +61,8 @@ while True:
 
         # === 3. Encode khuôn mặt ===
         img = face_recognition.load_image_file(path)
-        encodings = face_recognition.face_encodings(img)
+        face_locations = face_recognition.face_locations(img, model=ENCODING_DETECTOR)
+        encodings = face_recognition.face_encodings(img, known_face_locations=face_locations, num_jitters=ENCODING_JITTERS, model=ENCODING_MODEL)
 
         if len(encodings) > 0:
             encoding_list = encodings[0].tolist()
@@ -64,6 +71,7 @@ while True:
             db.collection("employees").document(selected_doc_id).update({
                 "faceRegistered": True,
                 "faceEncoding": encoding_list,
+                "faceEncodingVersion": ENCODING_VERSION,
                 "faceImagePath": path
             })
 